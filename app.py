@@ -1,10 +1,10 @@
 import streamlit as st
 import os
-import numpy as np
 from PIL import Image
 
 # Importação dos Módulos Locais
 import config
+import motor
 import styles
 import utils
 
@@ -44,6 +44,8 @@ def main():
     if logo_img:
         st.sidebar.image(logo_img, use_column_width=True)
     st.sidebar.markdown("---") 
+    if config.AQUECER_DICIONARIOS:
+        utils.exibir_aquecimento(utils.iniciar_aquecimento())
     
     st.title("🏭 Central de Dados")
     
@@ -72,8 +74,8 @@ def main():
 
         nome_arq_regras = config_class['arquivos'][cat_class]
         
-        # Carrega dicionário (usando Cache do utils)
-        df_dict, erro_dict = utils.carregar_dicionario_industria(nome_arq_regras)
+        # Carrega dicionário (usando Cache do motor)
+        df_dict, erro_dict = motor.carregar_dicionario_industria(nome_arq_regras)
         
         if erro_dict:
             st.error("Erro ao carregar dicionário de regras.")
@@ -83,15 +85,15 @@ def main():
             
             st.markdown("### 3. Upload da Base")
             file_sku_class = st.file_uploader(f"Base de SKUs ({ind_class} - {cat_class})", type=['xlsx', 'csv', 'xls'], key="up_class")
+            utils.exibir_validacao_dicionario(df_dict, file_sku_class)
 
             if file_sku_class:
                 st.divider()
                 with st.expander("🔍 Pré-visualização e Diagnóstico (Clique para abrir)", expanded=True):
-                    df_preview = utils.ler_arquivo_robusto(file_sku_class)
-                    file_sku_class.seek(0)
+                    df_preview = motor.ler_amostra_cacheada(file_sku_class)
 
                     if df_preview is not None:
-                        df_preview = utils.clean_column_names(df_preview)
+                        df_preview = motor.clean_column_names(df_preview)
                         cols_found = set(df_preview.columns)
                         
                         st.markdown("##### Diagnóstico de Colunas")
@@ -116,56 +118,70 @@ def main():
                 st.divider()
 
             if file_sku_class:
-                if st.button("🚀 Classificar", type="primary", key="btn_class"):
-                    df_sku = utils.ler_arquivo_robusto(file_sku_class)
-                    if df_sku is not None:
-                        df_sku.columns = df_sku.columns.str.strip()
-                        if 'Nome SKU' not in df_sku.columns:
-                            st.error("❌ A planilha deve conter a coluna 'Nome SKU'.")
-                        else:
-                            regras = utils.otimizar_regras(df_dict)
-                            if regras:
-                                with st.spinner("Classificando..."):
-                                    df_final, df_comp = utils.processar_dataframe_classificador(df_sku, regras, config_class)
-                                
-                                st.session_state['class_df_final'] = df_final
-                                st.session_state['class_df_comp'] = df_comp
-                                st.session_state['class_concluido'] = True
-                                st.rerun()
+                modo_paralelo = st.checkbox(
+                    f"⚡ Classificação paralela ({config.MAX_PROCESSOS} processos)", key="chk_paralelo_class",
+                    help="Divide atributos e blocos de descrições entre vários processos. Indicado para bases grandes."
+                )
+                coletar_diagnostico = st.checkbox("🩺 Coletar diagnóstico de desempenho", key="chk_diag_class",
+                                                  help="Mede o tempo de cada etapa e o custo de cada regra (deixa a classificação um pouco mais lenta).")
+                if st.button("🚀 Classificar", type="primary", key="btn_class", disabled=utils.tarefa_em_andamento('class')):
+                    st.session_state['class_concluido'] = False
+                    st.session_state['class_df_final'] = None
+                    st.session_state['class_df_comp'] = None
+                    st.session_state['class_instrumentacao'] = None
+                    utils.limpar_exportacoes('class')
+                    n_processos = config.MAX_PROCESSOS if modo_paralelo else 1
+                    upload = (file_sku_class.name, file_sku_class.getvalue())
+                    escopo = f"{ind_class}/{cat_class}"
+                    chave = utils.chave_tarefa('class', [upload], escopo, motor.impressao_digital_df(df_dict), coletar_diagnostico)
+                    utils.enviar_tarefa('class', utils.tarefa_classificacao, *upload, df_dict, config_class, escopo, n_processos,
+                                        coletar_diagnostico, chave=chave)
+                    st.rerun()
+
+            # Andamento da tarefa (também a de uma sessão anterior, reencontrada pela URL)
+            utils.acompanhar_tarefa('class')
 
+            tabelas_class = None
             if st.session_state['class_concluido'] and st.session_state['class_df_final'] is not None:
+                tabelas_class = utils.tabelas_da_sessao('class', 'class_df_final', 'class_df_comp')
+            if tabelas_class:
+                df_final_class, df_comp_class = tabelas_class
                 st.success("Processamento Concluído!")
+                if st.session_state.get('class_sem_resposta'):
+                    st.warning(f"⚠️ {st.session_state['class_sem_resposta']} busca(s) de regras protegidas ficaram sem resposta "
+                               "(estouro de tempo ou quarentena). Revise as regras em 🧪 Validação do Dicionário.")
+                formato_class = utils.seletor_formato("fmt_class")
                 c1, c2 = st.columns(2)
                 
-                data_hoje = utils.get_data_atual_str()
+                data_hoje = motor.get_data_atual_str()
                 nome_base_out = f"Classificados_{ind_class}_{cat_class}".replace(" ", "_").replace("/", "-")
                 nome_final_out = f"{nome_base_out}_{data_hoje}.xlsx"
                 nome_mudancas_out = f"Mudancas_{data_hoje}.xlsx"
 
-                c1.download_button(
-                    "📥 Baixar Classificados", 
-                    data=utils.to_excel_bytes(st.session_state['class_df_final']), 
-                    file_name=nome_final_out,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                # Dispara as duas exportações juntas antes de esperar por qualquer uma delas
+                instrumentacao_class = st.session_state.get('class_instrumentacao')
+                utils.agendar_exportacao('class', nome_final_out, st.session_state['class_df_final'], formato_class, instrumentacao_class)
+                if not df_comp_class.empty:
+                    utils.agendar_exportacao('class', nome_mudancas_out, st.session_state['class_df_comp'], formato_class, instrumentacao_class)
+
+                utils.botao_download("📥 Baixar Classificados", 'class', nome_final_out, st.session_state['class_df_final'], formato_class, container=c1)
                 
-                if not st.session_state['class_df_comp'].empty:
-                    c2.download_button(
-                        "📊 Relatório de Mudanças", 
-                        data=utils.to_excel_bytes(st.session_state['class_df_comp']), 
-                        file_name=nome_mudancas_out,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                if not df_comp_class.empty:
+                    utils.botao_download("📊 Relatório de Mudanças", 'class', nome_mudancas_out, st.session_state['class_df_comp'], formato_class, container=c2)
                 else:
                     c2.info("Sem alterações.")
                 
                 st.markdown("---")
-                utils.exibir_resumo_estatistico(st.session_state['class_df_final'], config_class['colunas'])
+                utils.exibir_resumo_estatistico(df_final_class, config_class['colunas'])
+                if instrumentacao_class is not None: utils.exibir_instrumentacao(instrumentacao_class, 'class')
 
                 if st.button("🔄 Limpar Classificador", key="limpar_class"):
                     st.session_state['class_concluido'] = False
                     st.session_state['class_df_final'] = None
                     st.session_state['class_df_comp'] = None
+                    st.session_state['class_instrumentacao'] = None
+                    utils.limpar_exportacoes('class')
+                    utils.esquecer_tarefa('class')
                     st.rerun()
 
     # -------------------------------------------------------------------------
@@ -196,11 +212,10 @@ def main():
                 selected_file_name = st.selectbox("Selecione um arquivo para inspecionar:", file_names)
                 selected_file = next(f for f in files_ext if f.name == selected_file_name)
                 
-                df_preview = utils.ler_arquivo_robusto(selected_file)
-                selected_file.seek(0)
+                df_preview = motor.ler_amostra_cacheada(selected_file)
                 
                 if df_preview is not None:
-                    df_preview = utils.clean_column_names(df_preview)
+                    df_preview = motor.clean_column_names(df_preview)
                     colunas_encontradas = set(df_preview.columns)
                     colunas_esperadas = set([config_ext['sku_origem']] + config_ext['colunas_atributos'])
                     
@@ -225,61 +240,34 @@ def main():
             st.divider()
 
         if files_ext:
-            if st.button("🚀 Processar Arquivos", key="btn_ext_proc"):
+            leitura_paralela = st.checkbox(
+                f"⚡ Leitura paralela ({config.MAX_PROCESSOS} processos)", key="chk_paralelo_ext",
+                help="Lê e limpa os arquivos simultaneamente. Indicado para lotes com muitos arquivos."
+            )
+            coletar_diagnostico_ext = st.checkbox("🩺 Coletar diagnóstico de desempenho", key="chk_diag_ext",
+                                                  help="Mede o tempo de cada etapa (leitura por arquivo, normalização por coluna, exportações).")
+            if st.button("🚀 Processar Arquivos", key="btn_ext_proc", disabled=utils.tarefa_em_andamento('ext')):
                 st.session_state['ext_arquivos'] = {}
+                utils.limpar_exportacoes('ext')
                 st.session_state['ext_erros'] = []
                 st.session_state['ext_ignorado'] = []
-                st.session_state['ext_concluida'] = False
-                
-                df_final_ext, conflitos_ext, debug_ext = utils.processar_arquivos_extrator(files_ext, config_ext)
-
-                if df_final_ext is None:
-                    st.session_state['ext_erros'] = conflitos_ext
-                else:
-                    st.session_state['ext_conflitos'] = conflitos_ext
-                    st.session_state['ext_concluido'] = True
-                    
-                    arquivos_out = {}
-                    relatorio_skip = []
+                st.session_state['ext_conflitos'] = None
+                st.session_state['ext_concluido'] = False
+                st.session_state.pop('ext_instrumentacao', None)
+                uploads = [(f.name, f.getvalue()) for f in files_ext]
+                chave = utils.chave_tarefa('ext', uploads, config_ext, coletar_diagnostico_ext, motor.get_data_atual_str())
+                utils.enviar_tarefa('ext', utils.tarefa_extracao, uploads, config_ext,
+                                    config.MAX_PROCESSOS if leitura_paralela else 1, coletar_diagnostico_ext, chave=chave)
+                st.rerun()
 
-                    data_hoje = utils.get_data_atual_str()
-                    nome_mestre = f"Mestre_Completo_{data_hoje}.xlsx"
-                    arquivos_out[nome_mestre] = df_final_ext
-                    
-                    # CORREÇÃO: Removido COL_NOME_SKU da lista de colunas do fragmento
-                    for col in config_ext["colunas_atributos"]:
-                        if col in df_final_ext.columns:
-                            cols_fragmento = [config.SKU_PADRAO_FINAL, col] # APENAS SKU E O ATRIBUTO
-                            cols_fragmento = [c for c in cols_fragmento if c in df_final_ext.columns]
-                            
-                            sub_df = df_final_ext[cols_fragmento].dropna(subset=[col])
-                            if not sub_df.empty:
-                                sub_df = sub_df[sub_df[col].astype(str).str.strip() != ""]
-                            
-                            if not sub_df.empty:
-                                total_sub = len(sub_df)
-                                nome_base = f"Planilha_{col.replace(' ', '_')}"
-                                if total_sub > 9000:
-                                    num_partes = int(np.ceil(total_sub / 9000))
-                                    partes = np.array_split(sub_df, num_partes)
-                                    for idx, parte in enumerate(partes):
-                                        arquivos_out[f"{nome_base}_Parte_{idx+1}.xlsx"] = parte
-                                else:
-                                    arquivos_out[f"{nome_base}.xlsx"] = sub_df
-                            else:
-                                relatorio_skip.append(f"⚠️ {col}: Vazia (Ignorada).")
-                        else:
-                            relatorio_skip.append(f"❌ {col}: Não encontrada.")
-                    
-                    st.session_state['ext_arquivos'] = arquivos_out
-                    st.session_state['ext_ignorado'] = relatorio_skip
-                    st.rerun()
+        utils.acompanhar_tarefa('ext')
 
         if st.session_state['ext_erros']:
             st.error("⛔ Erros críticos encontrados:")
             for erro in st.session_state['ext_erros']: st.error(erro)
 
-        if st.session_state['ext_concluido']:
+        tabelas_ext = utils.tabelas_da_sessao('ext', 'ext_conflitos') if st.session_state['ext_concluido'] else None
+        if tabelas_ext:
             st.markdown("---")
             st.header("3. Resultados")
 
@@ -287,30 +275,46 @@ def main():
                 with st.expander("⚠️ Relatório de Colunas Vazias/Ignoradas"):
                     for msg in st.session_state['ext_ignorado']: st.text(msg)
 
-            conflitos = st.session_state['ext_conflitos']
+            formato_ext = utils.seletor_formato("fmt_ext")
+            modo_zip = st.checkbox("🗜️ Baixar tudo em um único ZIP (arquivos gerados em paralelo)", key="chk_zip_ext")
+            conflitos, = tabelas_ext
+            arquivos = st.session_state['ext_arquivos']
+            instrumentacao_ext = st.session_state.get('ext_instrumentacao')
+            if not modo_zip:
+                for nome, id_arq in arquivos.items(): utils.agendar_exportacao('ext', nome, id_arq, formato_ext, instrumentacao_ext)
+
             if conflitos is not None and not conflitos.empty:
                 st.error(f"🚨 {conflitos[config.SKU_PADRAO_FINAL].nunique()} SKUs com divergências.")
-                st.download_button("📥 Baixar Erros", data=utils.to_excel_bytes(conflitos), file_name="ERROS_DUPLICIDADE.xlsx", key="dl_err_ext")
+                utils.botao_download("📥 Baixar Erros", 'ext', "ERROS_DUPLICIDADE.xlsx", st.session_state['ext_conflitos'], formato_ext,
+                                     instrumentacao=instrumentacao_ext, key="dl_err_ext")
 
             st.subheader("Downloads")
-            arquivos = st.session_state['ext_arquivos']
-            mestre_key = next((k for k in arquivos.keys() if "Mestre_Completo" in k), None)
-            
-            if mestre_key:
-                st.download_button("📦 Baixar Mestre Consolidado", data=utils.to_excel_bytes(arquivos[mestre_key]), file_name=mestre_key, key="dl_mestre")
-            
-            st.markdown("#### Planilhas Fragmentadas")
-            cols_layout = st.columns(2)
-            i = 0
-            for nome, df_arq in arquivos.items():
-                if "Mestre" not in nome:
-                    with cols_layout[i % 2]:
-                        st.download_button(f"📥 {nome}", data=utils.to_excel_bytes(df_arq), file_name=nome, key=f"dl_{nome}")
-                    i += 1
+            if modo_zip:
+                nome_zip = f"Extrator_{ind_ext}_{motor.get_data_atual_str()}.zip".replace(" ", "_").replace("/", "-")
+                utils.botao_download_zip(f"🗜️ Baixar Pacote ({len(arquivos)} arquivos)", 'ext', nome_zip, arquivos, formato_ext, key="dl_zip_ext")
+            else:
+                mestre_key = next((k for k in arquivos.keys() if "Mestre_Completo" in k), None)
+                
+                if mestre_key:
+                    utils.botao_download("📦 Baixar Mestre Consolidado", 'ext', mestre_key, arquivos[mestre_key], formato_ext, key="dl_mestre")
+                
+                st.markdown("#### Planilhas Fragmentadas")
+                cols_layout = st.columns(2)
+                i = 0
+                for nome, id_arq in arquivos.items():
+                    if "Mestre" not in nome:
+                        rotulo = f"📥 {motor.trocar_extensao(nome, formato_ext)}"
+                        utils.botao_download(rotulo, 'ext', nome, id_arq, formato_ext, container=cols_layout[i % 2], key=f"dl_{nome}")
+                        i += 1
             
+            if instrumentacao_ext is not None: utils.exibir_instrumentacao(instrumentacao_ext, 'ext')
+
             if st.button("🔄 Limpar Extrator"):
                 for key in ['ext_arquivos', 'ext_concluido', 'ext_erros', 'ext_ignorado', 'ext_conflitos']:
                     del st.session_state[key]
+                st.session_state.pop('ext_instrumentacao', None)
+                utils.limpar_exportacoes('ext')
+                utils.esquecer_tarefa('ext')
                 st.rerun()
 
 if __name__ == "__main__":
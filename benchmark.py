@@ -0,0 +1,324 @@
+"""
+Medições de desempenho do motor (sem interface).
+
+Exemplos:
+    python benchmark.py leitura
+    python benchmark.py leitura --industria MINALBA lote_janeiro/*.xlsx
+    python benchmark.py pipeline --industria "M.DIAS BRANCO" --linhas 10000 100000 1000000 --duplicadas 0.6
+    python benchmark.py comparar benchmark_1a2b3c4d_*.json benchmark_5e6f7a8b_*.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import config
+import motor
+from cli import listar_arquivos
+
+# Palavras sem regra associada, misturadas às do dicionário para compor descrições realistas
+PALAVRAS_NEUTRAS = ['PCT', 'UN', 'CX', 'KG', 'G', 'ML', 'L', 'C/12', 'SORT', 'PROMO', 'NOVO', 'TRAD']
+
+# ==============================================================================
+# AUXILIARES
+# ==============================================================================
+
+def cronometrar(funcao, repeticoes):
+    """Melhor tempo (s) de repeticoes execuções e o último resultado."""
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+class Medidor:
+    """Executa as etapas e registra o melhor tempo e o pico de memória de cada uma.
+
+    O pico vem do tracemalloc, em uma execução à parte para não distorcer o tempo;
+    ele não enxerga a memória de processos filhos (--processos > 1).
+    """
+
+    def __init__(self, repeticoes, medir_memoria):
+        self.repeticoes = repeticoes
+        self.medir_memoria = medir_memoria
+        self.contexto = {}
+        self.resultados = []
+
+    def __call__(self, etapa, funcao):
+        tempo, resultado = cronometrar(funcao, self.repeticoes)
+        pico = None
+        if self.medir_memoria:
+            tracemalloc.start()
+            try:
+                funcao()
+                pico = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            finally:
+                tracemalloc.stop()
+        self.resultados.append({**self.contexto, 'etapa': etapa, 'tempo_s': round(tempo, 4),
+                                'pico_memoria_mb': None if pico is None else round(pico, 1)})
+        print(f"  {etapa:<26} {tempo:9.3f}s" + ("" if pico is None else f"  {pico:9.1f} MB"))
+        return resultado
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def informacoes_ambiente():
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'alteracoes_locais': None if status is None else bool(status),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'motor_excel': motor.MOTOR_EXCEL or 'padrão',
+    }
+
+# ==============================================================================
+# BASES SINTÉTICAS
+# ==============================================================================
+
+def vocabulario_dicionario(df_dict):
+    """Palavras que disparam as regras: literais obrigatórios das regex e os valores de Interpretação."""
+    palavras = set()
+    for padrao in df_dict['Valor da Regra'].astype(str):
+        palavras.update(l.strip().upper() for l in (motor.extrair_literais(padrao) or ()) if len(l.strip()) > 1)
+    palavras.update(str(v).strip().upper() for v in df_dict['Interpretação'].dropna())
+    return sorted(p for p in palavras if p)
+
+def gerar_base_sintetica(df_dict, colunas_alvo, n_linhas, taxa_duplicadas=0.5, semente=42):
+    """Base de SKUs com descrições montadas a partir do vocabulário do dicionário.
+
+    taxa_duplicadas é a fração de linhas cuja descrição repete a de outra linha.
+    """
+    rng = np.random.default_rng(semente)
+    palavras = np.array(vocabulario_dicionario(df_dict) + PALAVRAS_NEUTRAS, dtype=object)
+    n_unicas = max(1, round(n_linhas * (1 - taxa_duplicadas)))
+    tamanhos = rng.integers(2, 7, n_unicas)
+    sorteio = rng.integers(0, len(palavras), tamanhos.sum())
+    # O número no final (como um código interno) garante descrições distintas
+    unicas, inicio = [], 0
+    for i, k in enumerate(tamanhos):
+        unicas.append(f"{' '.join(palavras[sorteio[inicio:inicio + k]])} {i}")
+        inicio += k
+    indices = np.concatenate([np.arange(n_unicas), rng.integers(0, n_unicas, n_linhas - n_unicas)])
+    rng.shuffle(indices)
+
+    df = pd.DataFrame({
+        config.SKU_PADRAO_FINAL: (7_890_000_000_000 + np.arange(n_linhas)).astype(str),
+        config.COL_NOME_SKU: np.array(unicas, dtype=object)[indices],
+    })
+    # Parte dos atributos já vem preenchida, para o relatório de mudanças ter valores "Antes"
+    for col in colunas_alvo:
+        df[col] = np.where(rng.random(n_linhas) < 0.2, "LEGADO", None)
+    return df
+
+# ==============================================================================
+# COMANDOS
+# ==============================================================================
+
+def comando_leitura(args):
+    """Compara o motor padrão (openpyxl) com o calamine, lendo todas as colunas ou só as necessárias."""
+    if args.industria:
+        colunas = motor.colunas_extrator(config.CONFIG_EXTRATOR[args.industria])
+        arquivos = [a for a in listar_arquivos(args.entradas) if a.lower().endswith(('.xlsx', '.xls'))]
+    else:
+        colunas = motor.COLUNAS_REGRAS
+        arquivos = sorted(
+            os.path.join(config.PASTA_DICIONARIOS, nome) for nome in os.listdir(config.PASTA_DICIONARIOS)
+            if nome.lower().endswith('.xlsx')
+        )
+    if not arquivos: sys.exit("Nenhum arquivo .xlsx/.xls encontrado.")
+
+    motores = [('openpyxl', None)] + ([('calamine', 'calamine')] if motor.MOTOR_EXCEL else [])
+    cenarios = [(f"{rotulo}{' + poda' if poda else ''}", motor_excel, poda) for rotulo, motor_excel in motores for poda in (False, True)]
+    totais = dict.fromkeys([rotulo for rotulo, _, _ in cenarios], 0.0)
+
+    motor_original = motor.MOTOR_EXCEL
+    try:
+        for caminho in arquivos:
+            print(f"{os.path.basename(caminho)} ({os.path.getsize(caminho) / 1024:.0f} KB)")
+            for rotulo, motor_excel, poda in cenarios:
+                motor.MOTOR_EXCEL = motor_excel
+                tempo, df = cronometrar(lambda: motor.ler_excel(caminho, colunas if poda else None), args.repeticoes)
+                totais[rotulo] += tempo
+                print(f"  {rotulo:<20} {tempo:8.3f}s  {df.shape[0]} linhas x {df.shape[1]} colunas")
+    finally:
+        motor.MOTOR_EXCEL = motor_original
+
+    base = totais['openpyxl']
+    print("\nTotal")
+    for rotulo, tempo in totais.items():
+        print(f"  {rotulo:<20} {tempo:8.3f}s  ({base / tempo:.1f}x)")
+    if not motor_original: print("\npython-calamine não instalado: apenas o motor padrão foi medido.")
+    return 0
+
+def _executar_pipeline(medir, df_dict, config_class, config_ext, base, args, pasta):
+    """Mede cada etapa do fluxo real: leitura, compilação, classificação (completa e incremental), relatório,
+    normalização, extrator e exportação."""
+    caminho_base = os.path.join(pasta, f"base.{args.entrada}")
+    with open(caminho_base, 'wb') as f:
+        f.write(motor.exportar_bytes(base, args.entrada))
+
+    def ler(caminho):
+        with open(caminho, 'rb') as f: return motor.ler_arquivo_robusto(f)
+
+    df_sku = medir('leitura', lambda: ler(caminho_base))
+
+    def compilar():
+        regras = motor._compilar_regras(df_dict)
+        for lista in regras.values(): motor.compilar_motor_regras(lista)
+        return regras
+
+    regras = medir('compilacao', compilar)
+    df_final, _ = medir('classificacao', lambda: motor.processar_dataframe_classificador(
+        df_sku, regras, config_class, n_processos=args.processos, copiar=False))
+
+    # Reexecução da mesma base com os resultados já armazenados (semana seguinte sem SKUs novos)
+    armazem = motor.ArmazemResultados(os.path.join(pasta, "resultados.sqlite3"))
+    motor.processar_dataframe_classificador(df_sku, regras, config_class, armazem=armazem)
+    medir('classificacao_incremental', lambda: motor.processar_dataframe_classificador(
+        df_sku, regras, config_class, n_processos=args.processos, armazem=armazem))
+
+    def relatorio():
+        ids = df_final[config.SKU_PADRAO_FINAL].to_numpy(dtype=object)
+        descricoes = df_final[config.COL_NOME_SKU].to_numpy(dtype=object)
+        partes = [
+            motor.relatorio_mudancas_coluna(col, df_sku[col].to_numpy(dtype=object), df_final[col].to_numpy(dtype=object), ids, descricoes)
+            for col in config_class['colunas'] if col in regras
+        ]
+        partes = [p for p in partes if p is not None]
+        return pd.concat(partes, ignore_index=True).infer_objects() if partes else pd.DataFrame()
+
+    medir('relatorio_mudancas', relatorio)
+
+    if config_ext:
+        colunas_texto = [c for c in config_ext['colunas_atributos'] + [config.COL_NOME_SKU] if c in df_final.columns]
+        medir('normalizacao', lambda: {col: motor.padronizar_serie_extrator(df_final[col]) for col in colunas_texto})
+        caminho_mestre = os.path.join(pasta, "classificado.csv")
+        with open(caminho_mestre, 'wb') as f:
+            f.write(motor.to_csv_bytes(df_final))
+
+        def extrair():
+            with open(caminho_mestre, 'rb') as f: return motor.processar_arquivos_extrator([f], config_ext)
+
+        medir('extrator', extrair)
+
+    for formato in args.formatos:
+        if formato == 'xlsx' and len(df_final) + 1 > motor.LIMITE_LINHAS_EXCEL: continue
+        medir(f'exportacao_{formato}', lambda: motor.exportar_bytes(df_final, formato))
+
+def comando_pipeline(args):
+    """Gera bases sintéticas a partir dos dicionários reais e mede cada etapa, gravando um relatório JSON."""
+    industrias = [args.industria] if args.industria else list(config.CONFIG_CLASSIFICADOR)
+    medir = Medidor(args.repeticoes, not args.sem_memoria)
+    ambiente = informacoes_ambiente()
+
+    for industria in industrias:
+        config_class = config.CONFIG_CLASSIFICADOR[industria]
+        categorias = [args.categoria] if args.categoria else list(config_class['arquivos'])
+        for categoria in categorias:
+            df_dict, erro = motor.carregar_dicionario_industria(config_class['arquivos'][categoria])
+            if erro:
+                print(f"{industria} / {categoria}: {erro}")
+                continue
+            for n_linhas in args.linhas:
+                print(f"{industria} / {categoria}: {n_linhas} linhas ({args.duplicadas:.0%} duplicadas)")
+                base = gerar_base_sintetica(df_dict, config_class['colunas'], n_linhas, args.duplicadas, args.semente)
+                medir.contexto = {'industria': industria, 'categoria': categoria, 'linhas': n_linhas,
+                                  'taxa_duplicadas': args.duplicadas, 'regras': len(df_dict)}
+                with tempfile.TemporaryDirectory() as pasta:
+                    _executar_pipeline(medir, df_dict, config_class, config.CONFIG_EXTRATOR.get(industria), base, args, pasta)
+
+    relatorio = {
+        'ambiente': ambiente,
+        'parametros': {'entrada': args.entrada, 'processos': args.processos, 'repeticoes': args.repeticoes,
+                       'semente': args.semente, 'formatos': args.formatos},
+        'pico_rss_mb': motor.pico_memoria_mb(),
+        'resultados': medir.resultados,
+    }
+    os.makedirs(args.saida, exist_ok=True)
+    caminho = os.path.join(args.saida, f"benchmark_{(ambiente['commit'] or 'sem-git')[:8]}_{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nRelatório: {caminho}")
+    return 0
+
+def comando_comparar(args):
+    """Compara dois relatórios do pipeline etapa a etapa; retorna 1 se alguma etapa ficou mais lenta que a tolerância."""
+    with open(args.anterior, encoding='utf-8') as f: anterior = json.load(f)
+    with open(args.atual, encoding='utf-8') as f: atual = json.load(f)
+    chave = lambda r: (r['industria'], r['categoria'], r['linhas'], r['taxa_duplicadas'], r['etapa'])
+    tempos_anteriores = {chave(r): r['tempo_s'] for r in anterior['resultados']}
+
+    print(f"{(anterior['ambiente']['commit'] or '?')[:8]} -> {(atual['ambiente']['commit'] or '?')[:8]}")
+    regressoes = 0
+    for r in atual['resultados']:
+        antes = tempos_anteriores.get(chave(r))
+        if antes is None: continue
+        razao = r['tempo_s'] / antes if antes else float('inf')
+        # Etapas de poucos milissegundos oscilam demais para indicar regressão
+        regrediu = razao > 1 + args.tolerancia and r['tempo_s'] - antes > 0.01
+        regressoes += regrediu
+        print(f"  {r['industria']} / {r['categoria']} {r['linhas']:>9} {r['etapa']:<26} "
+              f"{antes:9.3f}s -> {r['tempo_s']:9.3f}s ({razao:.2f}x){'  ⚠️ regressão' if regrediu else ''}")
+    return 1 if regressoes else 0
+
+# ==============================================================================
+# ENTRADA
+# ==============================================================================
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Suíte de Dados - medições de desempenho.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_leit = sub.add_parser("leitura", help="Tempo de leitura de planilhas por motor do Excel, com e sem poda de colunas.")
+    p_leit.add_argument("--industria", choices=list(config.CONFIG_EXTRATOR.keys()),
+                        help="Poda pelas colunas do extrator desta indústria (sem ela, lê os dicionários).")
+    p_leit.add_argument("--repeticoes", type=int, default=3)
+    p_leit.add_argument("entradas", nargs="*", help="Arquivos, pastas ou padrões glob (com --industria).")
+    p_leit.set_defaults(executar=comando_leitura)
+
+    p_pipe = sub.add_parser("pipeline", help="Mede todas as etapas com bases sintéticas geradas dos dicionários.")
+    p_pipe.add_argument("--industria", choices=list(config.CONFIG_CLASSIFICADOR.keys()), help="Padrão: todas.")
+    p_pipe.add_argument("--categoria", help="Padrão: todas as categorias da indústria.")
+    p_pipe.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000])
+    p_pipe.add_argument("--duplicadas", type=float, default=0.5, help="Fração de linhas com descrição repetida.")
+    p_pipe.add_argument("--entrada", default="csv", choices=['csv', 'xlsx'], help="Formato do arquivo lido na etapa de leitura.")
+    p_pipe.add_argument("--formatos", nargs="+", default=['xlsx', 'csv'], choices=list(motor.EXPORTADORES))
+    p_pipe.add_argument("--processos", type=int, default=1)
+    p_pipe.add_argument("--repeticoes", type=int, default=1)
+    p_pipe.add_argument("--sem-memoria", action="store_true", help="Não mede o pico de memória (metade do tempo).")
+    p_pipe.add_argument("--semente", type=int, default=42)
+    p_pipe.add_argument("--saida", default=".", help="Pasta do relatório JSON.")
+    p_pipe.set_defaults(executar=comando_pipeline)
+
+    p_comp = sub.add_parser("comparar", help="Compara dois relatórios do pipeline (ex.: antes e depois de um commit).")
+    p_comp.add_argument("anterior")
+    p_comp.add_argument("atual")
+    p_comp.add_argument("--tolerancia", type=float, default=0.10, help="Aumento relativo de tempo tolerado.")
+    p_comp.set_defaults(executar=comando_comparar)
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    return args.executar(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Execução em lote (sem interface) do Classificador e do Extrator.
+
+Exemplos:
+    python cli.py classificar --industria "M.DIAS BRANCO" --categoria Biscoitos bases/ --saida resultados/
+    python cli.py extrair --industria MINALBA lote_janeiro/*.xlsx --saida mestre/
+    python cli.py aquecer
+    python cli.py limpar-cache
+    python cli.py validar --industria "M.DIAS BRANCO" --categoria Biscoitos --amostra bases/janeiro.xlsx
+"""
+import argparse
+import glob
+import os
+import sys
+
+import config
+import motor
+
+EXTENSOES_ACEITAS = ('.xlsx', '.xls', '.csv')
+
+# ==============================================================================
+# AUXILIARES
+# ==============================================================================
+
+def listar_arquivos(entradas):
+    """Expande diretórios e padrões glob em uma lista ordenada de arquivos suportados."""
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = sorted(os.path.join(entrada, nome) for nome in os.listdir(entrada))
+        else:
+            candidatos = sorted(glob.glob(entrada)) or [entrada]
+        arquivos += [c for c in candidatos if os.path.isfile(c) and c.lower().endswith(EXTENSOES_ACEITAS)]
+    return arquivos
+
+def nomes_de_origem(arquivos):
+    """Nome de origem (sem extensão) de cada arquivo, usado nas saídas, sem repetições.
+
+    Arquivos de mesmo nome (ex.: a/dados.csv e b/dados.xlsx) recebem a pasta como prefixo
+    (a_dados, b_dados) e, se ainda coincidirem, um contador.
+    """
+    bases = [os.path.splitext(os.path.basename(c))[0] for c in arquivos]
+    nomes = []
+    for caminho, base in zip(arquivos, bases):
+        if bases.count(base) > 1:
+            pasta = os.path.basename(os.path.dirname(os.path.abspath(caminho)))
+            base = nome_seguro(f"{pasta}_{base}") if pasta else base
+        nome, n = base, 2
+        while nome in nomes:
+            nome, n = f"{base}_{n}", n + 1
+        nomes.append(nome)
+    return nomes
+
+def nome_seguro(texto):
+    return texto.replace(" ", "_").replace("/", "-")
+
+def salvar_diagnostico(instrumentacao, pasta_saida, nome_arquivo):
+    caminho = os.path.join(pasta_saida, nome_arquivo)
+    with open(caminho, 'wb') as f:
+        f.write(instrumentacao.para_excel())
+    print(f"  -> {caminho} (diagnóstico)")
+
+def informar_pico_memoria():
+    pico = motor.pico_memoria_mb()
+    if pico is not None: print(f"  Pico de memória: {pico:.0f} MB")
+
+def salvar_arquivo(df, pasta_saida, nome_arquivo, formato='xlsx'):
+    caminho = os.path.join(pasta_saida, motor.trocar_extensao(nome_arquivo, formato))
+    dados = motor.exportar_bytes(df, formato)  # antes de abrir o arquivo: um erro não deixa saída vazia
+    with open(caminho, 'wb') as f:
+        f.write(dados)
+    print(f"  -> {caminho} ({len(df)} linhas)")
+
+# ==============================================================================
+# COMANDOS
+# ==============================================================================
+
+def comando_classificar(args):
+    config_class = config.CONFIG_CLASSIFICADOR[args.industria]
+    if args.categoria not in config_class['arquivos']:
+        sys.exit(f"Categoria inválida para {args.industria}. Opções: {', '.join(config_class['arquivos'])}")
+
+    df_dict, erro_dict = motor.carregar_dicionario_industria(config_class['arquivos'][args.categoria])
+    if erro_dict: sys.exit(erro_dict)
+    regras = motor.otimizar_regras(df_dict)
+    if not regras: sys.exit("Dicionário sem as colunas de regra obrigatórias.")
+    armazem = None if args.completo or not config.RESULTADOS_INCREMENTAIS else motor.ARMAZEM_RESULTADOS
+    escopo = f"{args.industria}/{args.categoria}"
+
+    arquivos = listar_arquivos(args.entradas)
+    if not arquivos: sys.exit("Nenhum arquivo .xlsx/.xls/.csv encontrado nas entradas.")
+
+    data_hoje = motor.get_data_atual_str()
+    nome_base_out = nome_seguro(f"Classificados_{args.industria}_{args.categoria}")
+    falhas = 0
+    for caminho, origem in zip(arquivos, nomes_de_origem(arquivos)):
+        print(f"Classificando {caminho}...")
+        if args.fluxo and caminho.lower().endswith('.csv'):
+            destino = os.path.join(args.saida, f"{nome_base_out}_{origem}_{data_hoje}.csv")
+            destino_mudancas = os.path.join(args.saida, f"Mudancas_{origem}_{data_hoje}.csv")
+            try:
+                with open(caminho, 'rb') as f:
+                    linhas, mudancas = motor.classificar_em_fluxo(
+                        f, regras, config_class, destino, destino_mudancas, tamanho_bloco=args.bloco, armazem=armazem, escopo=escopo
+                    )
+            except ValueError as e:
+                print(f"  ❌ {e}")
+                falhas += 1
+                continue
+            print(f"  -> {destino} ({linhas} linhas, {mudancas} mudanças)")
+            continue
+
+        instrumentacao = motor.Instrumentacao() if args.diagnostico else None
+        with open(caminho, 'rb') as f, motor.medir_etapa(instrumentacao, "Leitura"):
+            df_sku = motor.ler_arquivo_robusto(f)
+        if df_sku is None:
+            print("  ❌ Arquivo ilegível ou formato inválido.")
+            falhas += 1
+            continue
+        df_sku.columns = df_sku.columns.str.strip()
+        if config.COL_NOME_SKU not in df_sku.columns:
+            print(f"  ❌ A planilha deve conter a coluna '{config.COL_NOME_SKU}'.")
+            falhas += 1
+            continue
+
+        df_final, df_comp = motor.processar_dataframe_classificador(
+            df_sku, regras, config_class, n_processos=args.processos, instrumentacao=instrumentacao, armazem=armazem, escopo=escopo,
+            copiar=False
+        )
+        sem_resposta = df_final.attrs.get('buscas_sem_resposta')
+        if sem_resposta:
+            print(f"  ⚠️ {sem_resposta} busca(s) de regras protegidas sem resposta (estouro de tempo ou quarentena): "
+                  "resultado degradado, não gravado para reaproveitamento.")
+        try:
+            with motor.medir_etapa(instrumentacao, "Exportação"):
+                salvar_arquivo(df_final, args.saida, f"{nome_base_out}_{origem}_{data_hoje}.xlsx", args.formato)
+                if not df_comp.empty:
+                    salvar_arquivo(df_comp, args.saida, f"Mudancas_{origem}_{data_hoje}.xlsx", args.formato)
+        except ValueError as e:  # ex.: mais linhas do que o Excel comporta
+            print(f"  ❌ {e} Use --formato csv ou --formato parquet.")
+            falhas += 1
+            continue
+        if instrumentacao is not None:
+            salvar_diagnostico(instrumentacao, args.saida, f"Diagnostico_{origem}_{data_hoje}.xlsx")
+        informar_pico_memoria()
+    return 1 if falhas else 0
+
+def comando_extrair(args):
+    config_ext = config.CONFIG_EXTRATOR[args.industria]
+    arquivos = listar_arquivos(args.entradas)
+    if not arquivos: sys.exit("Nenhum arquivo .xlsx/.xls/.csv encontrado nas entradas.")
+
+    print(f"Consolidando {len(arquivos)} arquivo(s)...")
+    instrumentacao = motor.Instrumentacao() if args.diagnostico else None
+    handles = [open(caminho, 'rb') for caminho in arquivos]
+    try:
+        df_final, conflitos, debug_cols = motor.processar_arquivos_extrator(
+            handles, config_ext, n_processos=args.processos or config.MAX_PROCESSOS, instrumentacao=instrumentacao
+        )
+    finally:
+        for f in handles: f.close()
+
+    for nome, info in debug_cols.items():
+        print(f"  ⚠️ {nome}: colunas ausentes {info['Faltaram']}")
+    if df_final is None:
+        for erro in conflitos: print(f"  {erro}")
+        return 1
+
+    data_hoje = motor.get_data_atual_str()
+    if conflitos is not None and not conflitos.empty:
+        print(f"  🚨 {conflitos[config.SKU_PADRAO_FINAL].nunique()} SKUs com divergências.")
+        salvar_arquivo(conflitos, args.saida, "ERROS_DUPLICIDADE.xlsx", args.formato)
+
+    with motor.medir_etapa(instrumentacao, "Fragmentação"):
+        fragmentos, relatorio_skip = motor.fragmentar_por_atributo(df_final, config_ext)
+    with motor.medir_etapa(instrumentacao, "Exportação"):
+        if args.zip:
+            arquivos = {f"Mestre_Completo_{data_hoje}.xlsx": df_final, **fragmentos}
+            caminho = os.path.join(args.saida, nome_seguro(f"Extrator_{args.industria}_{data_hoje}.zip"))
+            with open(caminho, 'wb') as f:
+                f.write(motor.gerar_zip(arquivos, args.formato, n_processos=args.processos))
+            print(f"  -> {caminho} ({len(arquivos)} arquivos)")
+        else:
+            salvar_arquivo(df_final, args.saida, f"Mestre_Completo_{data_hoje}.xlsx", args.formato)
+            for nome, df_arq in fragmentos.items():
+                salvar_arquivo(df_arq, args.saida, nome, args.formato)
+    for msg in relatorio_skip: print(f"  {msg}")
+    if instrumentacao is not None:
+        salvar_diagnostico(instrumentacao, args.saida, f"Diagnostico_Extrator_{data_hoje}.xlsx")
+    informar_pico_memoria()
+    return 0
+
+def comando_aquecer(args):
+    relatorio = motor.aquecer_dicionarios(config.CONFIG_CLASSIFICADOR, max_threads=args.threads)
+    for info in relatorio:
+        situacao = f"❌ {info['Erro']}" if info['Erro'] else (
+            f"{info['Regras']} regras, {info['Regex Inválidas']} regex inválidas, {info['Regex Suspeitas']} regex suspeitas"
+        )
+        print(f"{info['Arquivo']}: carga {info['Carga (s)']}s, compilação {info['Compilação (s)']}s - {situacao}")
+    return 1 if any(info['Erro'] for info in relatorio) else 0
+
+def comando_limpar_cache(args):
+    todos = not (args.dicionarios or args.resultados)
+    if args.dicionarios or todos:
+        removidos = motor.CACHE_DISCO.limpar()
+        print(f"{removidos} dicionário(s) compilado(s) removido(s) de {motor.CACHE_DISCO.pasta}.")
+    if args.resultados or todos:
+        situacao = "removidos" if motor.ARMAZEM_RESULTADOS.limpar() else "já estavam vazios"
+        print(f"Resultados de classificações anteriores ({motor.ARMAZEM_RESULTADOS.caminho}) {situacao}.")
+    return 0
+
+def comando_validar(args):
+    config_class = config.CONFIG_CLASSIFICADOR[args.industria]
+    if args.categoria not in config_class['arquivos']:
+        sys.exit(f"Categoria inválida para {args.industria}. Opções: {', '.join(config_class['arquivos'])}")
+    df_dict, erro_dict = motor.carregar_dicionario_industria(config_class['arquivos'][args.categoria])
+    if erro_dict: sys.exit(erro_dict)
+
+    for tipo, padrao, erro in motor.regex_invalidas(df_dict):
+        print(f"  ❌ Regex inválida em {tipo}: {padrao} ({erro})")
+    df_suspeitas = motor.diagnosticar_regras(df_dict)
+    print(f"{len(df_suspeitas)} regra(s) com risco de backtracking catastrófico (limite por busca: {config.ORCAMENTO_REGEX_MS} ms).")
+    for _, linha in df_suspeitas.iterrows():
+        print(f"  ⚠️ {linha['Valor da Regra']} -> {linha['Situação']}, pior {linha['Pior Tempo (ms)']} ms ({linha['Problemas']})")
+
+    if args.amostra:
+        with open(args.amostra, 'rb') as f:
+            df_sku = motor.ler_arquivo_robusto(f, [config.COL_NOME_SKU])
+        if df_sku is None or config.COL_NOME_SKU not in df_sku.columns:
+            sys.exit(f"A amostra deve conter a coluna '{config.COL_NOME_SKU}'.")
+        descricoes = df_sku[config.COL_NOME_SKU].dropna().drop_duplicates()
+        amostra = descricoes.sample(min(len(descricoes), args.n), random_state=0)
+        df_custo = motor.custo_regras(motor.otimizar_regras(df_dict), amostra)
+        print(f"Regras mais caras em {len(amostra)} descrições:")
+        for _, linha in df_custo.head(10).iterrows():
+            print(f"  {linha['Tempo Total (ms)']:>10.3f} ms  {linha['Coluna']}: {linha['Padrão']}")
+        if args.saida_custo:
+            salvar_arquivo(df_custo, args.saida, args.saida_custo)
+    return 1 if (df_suspeitas['Situação'] == "Quarentena").any() else 0
+
+# ==============================================================================
+# ENTRADA
+# ==============================================================================
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Suíte de Dados - Classificador & Extrator em lote.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_class = sub.add_parser("classificar", help="Classifica bases de SKUs com o dicionário da indústria/categoria.")
+    p_class.add_argument("--industria", required=True, choices=list(config.CONFIG_CLASSIFICADOR.keys()))
+    p_class.add_argument("--categoria", required=True)
+    p_class.add_argument("--processos", type=int, default=1, help="Processos para a classificação (padrão: 1).")
+    p_class.add_argument("--fluxo", action="store_true",
+                         help="CSVs são lidos e gravados em blocos (memória limitada); a saída é CSV ';'.")
+    p_class.add_argument("--bloco", type=int, default=100_000, help="Linhas por bloco no modo --fluxo.")
+    p_class.add_argument("--diagnostico", action="store_true", help="Grava também os tempos por etapa e o custo de cada regra.")
+    p_class.add_argument("--completo", action="store_true",
+                         help="Reclassifica todas as descrições, sem reaproveitar os resultados de execuções anteriores.")
+    p_class.add_argument("--formato", default="xlsx", choices=list(motor.EXPORTADORES), help="Formato dos arquivos gerados.")
+    p_class.add_argument("--saida", default=".", help="Pasta de saída (padrão: diretório atual).")
+    p_class.add_argument("entradas", nargs="+", help="Arquivos, pastas ou padrões glob.")
+    p_class.set_defaults(executar=comando_classificar)
+
+    p_ext = sub.add_parser("extrair", help="Consolida arquivos e gera o mestre e as planilhas por atributo.")
+    p_ext.add_argument("--industria", required=True, choices=list(config.CONFIG_EXTRATOR.keys()))
+    p_ext.add_argument("--formato", default="xlsx", choices=list(motor.EXPORTADORES), help="Formato dos arquivos gerados.")
+    p_ext.add_argument("--diagnostico", action="store_true", help="Grava também os tempos por etapa.")
+    p_ext.add_argument("--zip", action="store_true", help="Grava o mestre e os fragmentos em um único ZIP.")
+    p_ext.add_argument("--processos", type=int, default=None, help="Processos para ler os arquivos e gerar o ZIP (padrão: todos os núcleos).")
+    p_ext.add_argument("--saida", default=".", help="Pasta de saída (padrão: diretório atual).")
+    p_ext.add_argument("entradas", nargs="+", help="Arquivos, pastas ou padrões glob.")
+    p_ext.set_defaults(executar=comando_extrair)
+
+    p_aq = sub.add_parser("aquecer", help="Carrega e compila todos os dicionários (preenche o cache em disco).")
+    p_aq.add_argument("--threads", type=int, default=4)
+    p_aq.set_defaults(executar=comando_aquecer, saida=".")
+
+    p_limp = sub.add_parser("limpar-cache", help="Apaga os dicionários compilados e os resultados guardados em disco.")
+    p_limp.add_argument("--dicionarios", action="store_true", help="Apaga só os dicionários compilados.")
+    p_limp.add_argument("--resultados", action="store_true",
+                        help="Apaga só os resultados de classificações anteriores (a próxima execução reclassifica tudo).")
+    p_limp.set_defaults(executar=comando_limpar_cache, saida=".")
+
+    p_val = sub.add_parser("validar", help="Aponta regex lentas do dicionário e mede o custo de cada regra em uma amostra.")
+    p_val.add_argument("--industria", required=True, choices=list(config.CONFIG_CLASSIFICADOR.keys()))
+    p_val.add_argument("--categoria", required=True)
+    p_val.add_argument("--amostra", help="Base de SKUs usada para medir o custo das regras.")
+    p_val.add_argument("--n", type=int, default=config.AMOSTRA_CUSTO_REGRAS, help="Descrições distintas da amostra.")
+    p_val.add_argument("--saida-custo", help="Grava a tabela de custo completa neste arquivo .xlsx.")
+    p_val.add_argument("--saida", default=".", help="Pasta de saída (padrão: diretório atual).")
+    p_val.set_defaults(executar=comando_validar)
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    os.makedirs(args.saida, exist_ok=True)
+    return args.executar(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
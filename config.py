@@ -2,6 +2,7 @@ import os
 
 # --- CAMINHOS ---
 PASTA_DICIONARIOS = "dicionarios"
+PASTA_CACHE = ".cache"  # caches persistentes (dicionários compilados etc.)
 CAMINHO_ICONE = "assets/ícone.png"
 CAMINHO_LOGO = "assets/logo.png"
 
@@ -9,6 +10,37 @@ CAMINHO_LOGO = "assets/logo.png"
 SKU_PADRAO_FINAL = "Código Barras SKU"
 COL_NOME_SKU = "Nome SKU"
 
+# --- PROCESSAMENTO PARALELO ---
+MAX_PROCESSOS = os.cpu_count() or 1
+TAMANHO_BLOCO_PARALELO = 5000  # descrições distintas por tarefa do pool
+TAMANHO_BLOCO_INDICE = 100_000  # descrições distintas por índice invertido (limita a memória do índice)
+
+# --- CACHE DE UPLOADS (pré-visualização e processamento compartilham a mesma leitura) ---
+MAX_UPLOADS_EM_CACHE = 8
+MAX_MB_UPLOADS_EM_CACHE = 512  # soma da memória dos DataFrames lidos mantidos em cache
+
+# --- PROTEÇÃO CONTRA REGEX LENTAS (BACKTRACKING CATASTRÓFICO) ---
+PROTEGER_REGEX = True     # regras suspeitas rodam com limite de tempo (módulo regex) ou, sem ele, vão para quarentena
+ORCAMENTO_REGEX_MS = 50   # tempo máximo de uma busca de regra suspeita
+MAX_ESTOUROS_REGEX = 3    # estouros do limite após os quais a regra protegida é desligada (quarentena)
+AMOSTRA_CUSTO_REGRAS = 500  # descrições distintas usadas para medir o custo de cada regra
+
+# --- RESULTADOS INCREMENTAIS ---
+# Descrições já classificadas com a mesma versão do dicionário são reaproveitadas (SQLite em PASTA_CACHE)
+RESULTADOS_INCREMENTAIS = True
+
+# --- TAREFAS EM SEGUNDO PLANO ---
+# Classificações e extrações rodam em uma fila do servidor; o resultado fica em PASTA_CACHE/tarefas
+MAX_TAREFAS_SIMULTANEAS = 2
+VALIDADE_TAREFAS_HORAS = 24  # tarefas encerradas (e tabelas sem acesso) há mais tempo são apagadas do disco
+# Resultados ficam em PASTA_CACHE/tabelas (Parquet); a sessão guarda só o id e as sessões
+# que abrem o mesmo resultado compartilham uma única cópia em memória
+MAX_MB_TABELAS_EM_DISCO = 4096
+MAX_MB_TABELAS_EM_MEMORIA = 512
+
+# --- PRÉ-CARREGAMENTO ---
+AQUECER_DICIONARIOS = True  # carrega e compila todos os dicionários em segundo plano ao iniciar o app
+
 # --- CONFIGURAÇÃO DO CLASSIFICADOR ---
 CONFIG_CLASSIFICADOR = {
     "M.DIAS BRANCO": {
@@ -63,9 +95,12 @@ CONFIG_CLASSIFICADOR = {
 }
 
 # --- CONFIGURAÇÃO DO EXTRATOR ---
+TAMANHO_FRAGMENTO_PADRAO = 9000  # linhas por planilha fragmentada (limite de importação)
+
 CONFIG_EXTRATOR = {
     "ALVOAR / BETANIA": {
         "sku_origem": "Código Barras SKU",
+        "tamanho_fragmento": 9000,
         "colunas_atributos": [
             'Categoria', 'Subcategoria', 'Sabor', 'Gramatura', 
             'Embalagem', 'Marca', 'Frio Seco', 'Kids', 'Linha', 'Zero Lactose'
@@ -73,6 +108,7 @@ CONFIG_EXTRATOR = {
     },
     "AVINE": {
         "sku_origem": "Código Barras SKU",
+        "tamanho_fragmento": 9000,
         "colunas_atributos": [
             'FAMÍLIA DE VENDAS', 'COR', 'TIPO', 'TAMANHO', 
             'BANDEJA', 'CONCATENADO', 'PERFIL'
@@ -80,6 +116,7 @@ CONFIG_EXTRATOR = {
     },
     "FROSTY": {
         "sku_origem": "Código Barras SKU",
+        "tamanho_fragmento": 9000,
         "colunas_atributos": [
             'SUBCATEGORIA', 'SABOR', 'UNIDADE DE MEDIDA', 
             'Restritivos', 'AÇÚCAR'
@@ -87,6 +124,7 @@ CONFIG_EXTRATOR = {
     },
     "MINALBA": {
         "sku_origem": "Código Barras SKU",
+        "tamanho_fragmento": 9000,
         "colunas_atributos": [
             'CATEGORIA', 'SUBCATEGORIA', 'SEGMENTO', 'EMBALAGEM', 
             'INTERVALO EMBALAGEM', 'TAMANHO EMBALAGEM', 
@@ -95,6 +133,7 @@ CONFIG_EXTRATOR = {
     },
     "SÃO GERALDO (CAJUINA)": {
         "sku_origem": "Código Barras SKU",
+        "tamanho_fragmento": 9000,
         "colunas_atributos": [
             'TIPO', 'CONSUMO', 'SABOR', 'EMBALAGEM', 
             'SEM ACUCAR', 'GRAMATURA CSG'
@@ -102,6 +141,7 @@ CONFIG_EXTRATOR = {
     },
     "M.DIAS BRANCO": {
         "sku_origem": "Código Barras SKU",
+        "tamanho_fragmento": 9000,
         "colunas_atributos": [
             'SubCategoria MDB', 'Gramatura MDB', 'CLASSIFICAÇÃO DO ITEM', 
             'Marca', 'Familia', 'SubFamilia', 'SubMarca', 'Unidade de Medida'
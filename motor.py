@@ -0,0 +1,1781 @@
+"""
+Motor de processamento (backend puro) do Classificador e do Extrator.
+
+Não depende do Streamlit: o progresso é reportado por um callback opcional
+progresso(fracao, mensagem=None) e o cache é próprio (CacheMemoria), de modo que as
+funções podem rodar em pools de processos, lotes (cli.py), testes e benchmarks.
+"""
+import pandas as pd
+import re
+import io
+import os
+import csv
+import codecs
+import zipfile
+import numpy as np
+import unicodedata
+import time
+import hashlib
+import pickle
+import sqlite3
+from array import array
+import sys
+import importlib.util
+import threading
+import shutil
+import uuid
+import multiprocessing
+from collections import OrderedDict
+from contextlib import closing, contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse, sre_constants
+try:
+    import regex as _regex  # opcional: limite de tempo por busca no modo protegido
+except ImportError:
+    _regex = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from config import (PASTA_DICIONARIOS, PASTA_CACHE, SKU_PADRAO_FINAL, COL_NOME_SKU, TAMANHO_BLOCO_PARALELO, TAMANHO_BLOCO_INDICE,
+                    MAX_UPLOADS_EM_CACHE, MAX_MB_UPLOADS_EM_CACHE, MAX_PROCESSOS, TAMANHO_FRAGMENTO_PADRAO,
+                    PROTEGER_REGEX, ORCAMENTO_REGEX_MS, MAX_ESTOUROS_REGEX, MAX_MB_TABELAS_EM_DISCO, MAX_MB_TABELAS_EM_MEMORIA,
+                    VALIDADE_TAREFAS_HORAS)
+
+# ==============================================================================
+# CACHE E PROGRESSO
+# ==============================================================================
+
+class CacheMemoria:
+    """Cache LRU em memória, seguro para threads, limitado por itens e (opcionalmente) por peso."""
+
+    def __init__(self, max_itens=32, max_peso=None):
+        self.max_itens = max_itens
+        self.max_peso = max_peso
+        self._itens = OrderedDict()
+        self._pesos = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, fabrica, peso=1):
+        """Valor em cache ou fabrica(); peso pode ser uma função do valor criado (ex.: memória do DataFrame)."""
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+        valor = fabrica()
+        if callable(peso): peso = peso(valor)
+        with self._lock:
+            self._itens[chave] = valor
+            self._pesos[chave] = peso
+            self._itens.move_to_end(chave)
+            # O item recém-inserido nunca é descartado, mesmo que sozinho passe do limite de peso
+            while len(self._itens) > 1 and (
+                len(self._itens) > self.max_itens
+                or (self.max_peso is not None and sum(self._pesos.values()) > self.max_peso)
+            ):
+                antiga, _ = self._itens.popitem(last=False)
+                del self._pesos[antiga]
+        return valor
+
+    def consultar(self, chave, padrao=None):
+        """Valor em cache (marcado como usado recentemente) ou padrao, sem calcular nada."""
+        with self._lock:
+            if chave not in self._itens: return padrao
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+class CacheDisco:
+    """Cache persistente em arquivos pickle, compartilhado entre processos.
+
+    A chave deve mudar sempre que a origem muda (ex.: hash do conteúdo); entradas antigas
+    são descartadas quando a pasta passa de max_arquivos (as menos usadas primeiro).
+    """
+
+    def __init__(self, pasta, max_arquivos=64):
+        self.pasta = pasta
+        self.max_arquivos = max_arquivos
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.pkl")
+
+    def obter(self, chave, fabrica):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as f: valor = pickle.load(f)
+            os.utime(caminho)
+            return valor
+        except FileNotFoundError: pass
+        except Exception: pass  # Arquivo corrompido ou de versão incompatível: recria
+
+        valor = fabrica()
+        try:
+            os.makedirs(self.pasta, exist_ok=True)
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            with open(temporario, 'wb') as f: pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, caminho)
+            self._podar()
+        except OSError: pass  # Sem permissão de escrita: segue apenas com o cache em memória
+        return valor
+
+    def _podar(self):
+        arquivos = [os.path.join(self.pasta, n) for n in os.listdir(self.pasta) if n.endswith('.pkl')]
+        if len(arquivos) <= self.max_arquivos: return
+        arquivos.sort(key=os.path.getmtime)
+        for caminho in arquivos[:len(arquivos) - self.max_arquivos]:
+            try: os.remove(caminho)
+            except OSError: pass
+
+    def limpar(self):
+        """Apaga todas as entradas gravadas e retorna quantas foram removidas."""
+        try: nomes = os.listdir(self.pasta)
+        except FileNotFoundError: return 0
+        removidos = 0
+        for nome in nomes:
+            if not nome.endswith(('.pkl', '.tmp')): continue
+            try:
+                os.remove(os.path.join(self.pasta, nome))
+                removidos += nome.endswith('.pkl')
+            except OSError: pass
+        return removidos
+
+CACHE_DICIONARIOS = CacheMemoria()
+CACHE_REGRAS = CacheMemoria()
+# Uploads já lidos, por hash do conteúdo; o peso é a memória ocupada pelo DataFrame lido
+CACHE_UPLOADS = CacheMemoria(max_itens=MAX_UPLOADS_EM_CACHE, max_peso=MAX_MB_UPLOADS_EM_CACHE * 1024 * 1024)
+# Incremente ao mudar o formato das tabelas/regras gravadas em disco
+VERSAO_CACHE_DISCO = 4
+CACHE_DISCO = CacheDisco(os.path.join(PASTA_CACHE, "dicionarios"))
+
+class ArmazemResultados:
+    """Resultados de classificação persistidos em SQLite, por (versão das regras, escopo, descrição).
+
+    A versão é o hash das regras compiladas: ao trocar o dicionário ela muda, os resultados
+    antigos deixam de ser encontrados e são apagados na próxima gravação do mesmo escopo.
+    Cada operação abre a própria conexão, de modo que threads e processos podem compartilhar o arquivo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS resultados (versao TEXT, escopo TEXT, descricao TEXT, valores BLOB,"
+            " PRIMARY KEY (versao, escopo, descricao)) WITHOUT ROWID"
+        )
+        return conexao
+
+    def consultar(self, versao, escopo, descricoes):
+        """Valores armazenados ({descrição: tupla com um valor por coluna}) das descrições já classificadas."""
+        if not descricoes: return {}
+        try:
+            with closing(self._conectar()) as conexao:
+                conexao.execute("CREATE TEMP TABLE consulta (descricao TEXT PRIMARY KEY) WITHOUT ROWID")
+                conexao.executemany("INSERT OR IGNORE INTO consulta VALUES (?)", ((d,) for d in descricoes))
+                linhas = conexao.execute(
+                    "SELECT r.descricao, r.valores FROM consulta c JOIN resultados r"
+                    " ON r.versao = ? AND r.escopo = ? AND r.descricao = c.descricao", (versao, escopo)
+                )
+                return {descricao: pickle.loads(valores) for descricao, valores in linhas}
+        except (sqlite3.Error, OSError):
+            return {}  # Armazém indisponível ou corrompido: classifica tudo
+
+    def gravar(self, versao, escopo, descricoes, valores):
+        """Grava os resultados novos e descarta os de outras versões do mesmo escopo."""
+        try:
+            with closing(self._conectar()) as conexao, conexao:
+                conexao.execute("DELETE FROM resultados WHERE escopo = ? AND versao <> ?", (escopo, versao))
+                conexao.executemany(
+                    "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?)",
+                    ((versao, escopo, d, pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)) for d, v in zip(descricoes, valores))
+                )
+        except (sqlite3.Error, OSError):
+            pass  # Sem permissão de escrita: apenas não guarda para a próxima vez
+
+    def limpar(self):
+        """Apaga o arquivo (e o diário WAL); retorna se havia resultados gravados."""
+        existia = os.path.exists(self.caminho)
+        for caminho in (self.caminho, f"{self.caminho}-wal", f"{self.caminho}-shm"):
+            try: os.remove(caminho)
+            except FileNotFoundError: pass
+        return existia
+
+def versao_regras(motores):
+    """Hash das regras usadas na classificação (colunas, padrões, valores, scores e modo de busca)."""
+    conteudo = [
+        (col, [(type(r['pattern']).__name__, r['pattern'].pattern, r['value'], r['score']) for r in motor['regras']])
+        for col, motor in motores.items()
+    ]
+    return hashlib.sha1(repr(conteudo).encode()).hexdigest()
+
+ARMAZEM_RESULTADOS = ArmazemResultados(os.path.join(PASTA_CACHE, "resultados.sqlite3"))
+
+class ArmazemTabelas:
+    """DataFrames de resultado guardados em disco (Parquet) e referenciados por um id curto.
+
+    As sessões guardam só o id: quem abre o mesmo resultado compartilha a mesma cópia em memória
+    (CacheMemoria limitada por max_mb_memoria). Em disco, as tabelas sem acesso há mais de
+    validade_horas são apagadas e, acima de max_mb_disco, as menos usadas saem primeiro.
+    Tabelas que o Arrow não representa (colunas object com tipos mistos) vão em pickle.
+    """
+
+    def __init__(self, pasta, max_mb_disco=4096, max_mb_memoria=512, validade_horas=24):
+        self.pasta = pasta
+        self.max_bytes_disco = max_mb_disco * 1024 * 1024
+        self.validade_s = validade_horas * 3600
+        self._memoria = CacheMemoria(max_itens=64, max_peso=max_mb_memoria * 1024 * 1024)
+
+    def _caminhos(self, id_tabela):
+        base = os.path.join(self.pasta, id_tabela)
+        return base + ".parquet", base + ".pkl"
+
+    def guardar(self, df):
+        id_tabela = uuid.uuid4().hex
+        os.makedirs(self.pasta, exist_ok=True)
+        parquet, pkl = self._caminhos(id_tabela)
+        temporario = f"{parquet}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(temporario)
+            os.replace(temporario, parquet)
+        except Exception:
+            if os.path.exists(temporario): os.remove(temporario)
+            with open(temporario, "wb") as f: pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, pkl)
+        self._memoria.obter(id_tabela, lambda: df, peso=peso_df(df))
+        self.podar()
+        return id_tabela
+
+    def _ler(self, id_tabela):
+        parquet, pkl = self._caminhos(id_tabela)
+        try:
+            df, caminho = pd.read_parquet(parquet, memory_map=True), parquet
+        except FileNotFoundError:
+            try:
+                with open(pkl, "rb") as f: df, caminho = pickle.load(f), pkl
+            except FileNotFoundError:
+                return None
+        os.utime(caminho)  # marca o uso recente para a poda
+        return df
+
+    def carregar(self, id_tabela):
+        """DataFrame do id (compartilhado: não altere), ou None se ele expirou."""
+        if not re.fullmatch(r'[0-9a-f]{32}', id_tabela or ''): return None
+        df = self._memoria.consultar(id_tabela)
+        if df is not None: return df
+        df = self._ler(id_tabela)
+        if df is None: return None
+        return self._memoria.obter(id_tabela, lambda: df, peso=peso_df(df))
+
+    def existe(self, id_tabela):
+        return any(os.path.exists(c) for c in self._caminhos(id_tabela))
+
+    def podar(self):
+        try: nomes = os.listdir(self.pasta)
+        except OSError: return
+        arquivos = []
+        for nome in nomes:
+            if nome.endswith(".tmp"): continue
+            caminho = os.path.join(self.pasta, nome)
+            try: arquivos.append((os.path.getmtime(caminho), os.path.getsize(caminho), caminho))
+            except OSError: continue
+        arquivos.sort()
+        limite = time.time() - self.validade_s
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for mtime, tamanho, caminho in arquivos[:-1]:  # a tabela mais recente nunca sai
+            if mtime >= limite and total <= self.max_bytes_disco: break
+            try: os.remove(caminho)
+            except OSError: continue
+            total -= tamanho
+
+ARMAZEM_TABELAS = ArmazemTabelas(os.path.join(PASTA_CACHE, "tabelas"), MAX_MB_TABELAS_EM_DISCO, MAX_MB_TABELAS_EM_MEMORIA,
+                                 VALIDADE_TAREFAS_HORAS)
+
+def _sem_progresso(fracao, mensagem=None):
+    pass
+
+class Instrumentacao:
+    """Coleta opcional de tempos por etapa (e por coluna) e, por regra, avaliações, acertos, tempo de regex
+    e buscas sem resposta das regras protegidas (estouros de tempo e buscas ignoradas em quarentena).
+
+    Avaliações e acertos contam descrições distintas: as avaliações são as descrições ainda pendentes
+    que contêm os literais da regra (ver classificar_por_indice). O tempo de regex inclui a consulta
+    ao índice e a compilação preguiçosa na primeira busca de cada padrão. A memória de cada etapa
+    é amostrada durante ela (ver AmostradorMemoria): o pico residente do processo na etapa e o
+    acréscimo sobre o início dela. Não inclui os processos do pool, e no servidor o residente
+    também conta o que outras sessões alocam ao mesmo tempo.
+    """
+
+    def __init__(self):
+        self.etapas = []
+        self.regras = {}   # coluna -> {índice da regra: [avaliações, acertos, segundos]}
+        self.falhas = {}   # coluna -> {índice da regra: [estouros de tempo, buscas ignoradas em quarentena]}
+        self._listas = {}  # coluna -> lista de regras (padrão/interpretação de cada índice)
+
+    @contextmanager
+    def etapa(self, nome, coluna=None):
+        inicio = time.perf_counter()
+        memoria = AmostradorMemoria()
+        try: yield
+        finally:
+            pico, acrescimo = memoria.parar()
+            self.etapas.append({'Etapa': nome, 'Coluna': coluna, 'Tempo (s)': time.perf_counter() - inicio,
+                                'Pico de Memória (MB)': pico, 'Acréscimo de Memória (MB)': acrescimo})
+
+    def estatisticas_regras(self, coluna, regras_lista):
+        """Dicionário de contadores da coluna, a ser preenchido por classificar_por_indice."""
+        self._listas[coluna] = regras_lista
+        return self.regras.setdefault(coluna, {})
+
+    def somar_estatisticas(self, coluna, parciais):
+        """Acumula contadores vindos de outro processo."""
+        estatisticas = self.regras[coluna]
+        for idx, (avaliacoes, acertos, segundos) in parciais.items():
+            atual = estatisticas.setdefault(idx, [0, 0, 0.0])
+            atual[0] += avaliacoes; atual[1] += acertos; atual[2] += segundos
+
+    def somar_falhas(self, coluna, parciais):
+        """Acumula as buscas sem resposta das regras protegidas (ver RegexProtegida)."""
+        somar_falhas(self.falhas.setdefault(coluna, {}), parciais)
+
+    def tabela_etapas(self):
+        df = pd.DataFrame(self.etapas, columns=['Etapa', 'Coluna', 'Tempo (s)', 'Pico de Memória (MB)',
+                                                'Acréscimo de Memória (MB)'])
+        return df.assign(**{'Tempo (s)': df['Tempo (s)'].round(4)})
+
+    def tabela_regras(self):
+        linhas = []
+        for coluna, estatisticas in self.regras.items():
+            for idx, (avaliacoes, acertos, segundos) in estatisticas.items():
+                regra = self._listas[coluna][idx]
+                estouros, ignoradas = self.falhas.get(coluna, {}).get(idx, (0, 0))
+                linhas.append({
+                    'Coluna': coluna, 'Padrão': regra['pattern'].pattern, 'Interpretação': regra['value'],
+                    'Score': regra['score'], 'Avaliações': avaliacoes, 'Acertos': acertos,
+                    'Tempo Regex (s)': round(segundos, 6), 'Estouros de Tempo': estouros,
+                    'Ignoradas (Quarentena)': ignoradas,
+                })
+        colunas = ['Coluna', 'Padrão', 'Interpretação', 'Score', 'Avaliações', 'Acertos', 'Tempo Regex (s)',
+                   'Estouros de Tempo', 'Ignoradas (Quarentena)']
+        return pd.DataFrame(linhas, columns=colunas).sort_values('Tempo Regex (s)', ascending=False, ignore_index=True)
+
+    def para_excel(self):
+        """Planilha com as abas Etapas e Regras."""
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            self.tabela_etapas().to_excel(writer, sheet_name='Etapas', index=False)
+            self.tabela_regras().to_excel(writer, sheet_name='Regras', index=False)
+        return output.getvalue()
+
+def pico_memoria_mb():
+    """Pico de memória residente do processo desde que ele começou (None onde o módulo resource não existe).
+
+    Serve a processos de uma execução só (cli.py, benchmark.py); no servidor, use AmostradorMemoria.
+    """
+    if resource is None: return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / 1024 ** (2 if sys.platform == 'darwin' else 1), 1)  # bytes no macOS, KB no Linux
+
+def memoria_atual_mb():
+    """Memória residente atual do processo (None onde /proc não existe, ex.: Windows e macOS)."""
+    try:
+        with open('/proc/self/statm') as f: paginas = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+class AmostradorMemoria:
+    """Amostra a memória residente em uma thread enquanto um trecho roda; parar() devolve
+    (pico, acréscimo sobre o início) em MB, ou (None, None) onde a memória atual não é legível."""
+
+    def __init__(self, intervalo_s=0.01):
+        self.inicio = self.pico = memoria_atual_mb()
+        self._parar = threading.Event()
+        self._thread = None
+        if self.inicio is None: return
+        self._thread = threading.Thread(target=self._amostrar, args=(intervalo_s,), daemon=True)
+        self._thread.start()
+
+    def _amostrar(self, intervalo_s):
+        while not self._parar.wait(intervalo_s):
+            self.pico = max(self.pico, memoria_atual_mb())
+
+    def parar(self):
+        if self._thread is None: return None, None
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, memoria_atual_mb())
+        return round(self.pico, 1), round(self.pico - self.inicio, 1)
+
+def medir_etapa(instrumentacao, nome, coluna=None):
+    """Contexto que cronometra a etapa quando há instrumentação (sem ela, não faz nada)."""
+    return instrumentacao.etapa(nome, coluna) if instrumentacao is not None else nullcontext()
+
+def hash_arquivo(caminho):
+    """SHA-256 do conteúdo do arquivo."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''): h.update(bloco)
+    return h.hexdigest()
+
+def impressao_digital_df(df):
+    """Hash estável do conteúdo de um DataFrame (usado como chave de cache)."""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes() + repr(list(df.columns)).encode()).hexdigest()
+
+# ==============================================================================
+# FUNÇÕES DE LÓGICA (BACKEND)
+# ==============================================================================
+
+def get_data_atual_str():
+    return datetime.now().strftime("%d-%m-%Y")
+
+# --- EXPORTAÇÃO ---
+LIMITE_LINHAS_EXCEL = 1_048_576
+_TIPOS_NATIVOS_EXCEL = (str, int, float, bool, datetime, date)
+
+def _valor_excel(valor):
+    # Mesmas conversões do pandas.to_excel: vazios viram célula em branco, ±inf vira o texto 'inf'/'-inf'
+    # (inf_rep) e timedelta vira dias
+    if isinstance(valor, np.generic): valor = valor.item()
+    if valor is None or valor is pd.NA or valor is pd.NaT: return None
+    if isinstance(valor, float):
+        if np.isnan(valor): return None
+        if np.isinf(valor): return 'inf' if valor > 0 else '-inf'
+    if isinstance(valor, timedelta): return valor.total_seconds() / 86400
+    return valor if isinstance(valor, _TIPOS_NATIVOS_EXCEL) else str(valor)
+
+def to_excel_bytes(df, tamanho_bloco=20_000):
+    """Serializa em .xlsx com o xlsxwriter em modo constant_memory (grava e descarta linha a linha).
+
+    O df.to_excel do pandas emite as células coluna a coluna, o que é incompatível com o
+    constant_memory; por isso as linhas são escritas aqui, em blocos.
+    """
+    if len(df) + 1 > LIMITE_LINHAS_EXCEL:
+        raise ValueError(f"{len(df)} linhas excedem o limite do Excel; exporte em CSV ou Parquet.")
+    import xlsxwriter
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'remove_timezone': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    worksheet = workbook.add_worksheet()
+    formato_cabecalho = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], formato_cabecalho)
+    for inicio in range(0, len(df), tamanho_bloco):
+        bloco = df.iloc[inicio:inicio + tamanho_bloco]
+        colunas = [[_valor_excel(v) for v in bloco.iloc[:, j].to_numpy(dtype=object)] for j in range(bloco.shape[1])]
+        for i, linha in enumerate(zip(*colunas), start=inicio + 1):
+            worksheet.write_row(i, 0, linha)
+    workbook.close()
+    return output.getvalue()
+
+def to_csv_bytes(df):
+    return df.to_csv(index=False, sep=';').encode('utf-8-sig')
+
+def to_parquet_bytes(df):
+    output = io.BytesIO()
+    try:
+        df.to_parquet(output, index=False)
+    except Exception:
+        # Colunas object (ou categóricas) com tipos mistos (ex.: 'Antes'/'Depois') não têm tipo Arrow único
+        output = io.BytesIO()
+        mistas = {
+            c: df[c].astype(object).map(lambda v: v if pd.isna(v) else str(v))
+            for c in df.columns if df[c].dtype == object or isinstance(df[c].dtype, pd.CategoricalDtype)
+        }
+        df.assign(**mistas).to_parquet(output, index=False)
+    return output.getvalue()
+
+EXPORTADORES = {'xlsx': to_excel_bytes, 'csv': to_csv_bytes}
+if importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet'):
+    EXPORTADORES['parquet'] = to_parquet_bytes
+MIME_EXPORTACAO = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv",
+    'parquet': "application/vnd.apache.parquet",
+}
+
+def exportar_bytes(df, formato='xlsx'):
+    return EXPORTADORES[formato](df)
+
+def trocar_extensao(nome_arquivo, formato):
+    return f"{os.path.splitext(nome_arquivo)[0]}.{formato}"
+
+def gerar_zip(arquivos, formato='xlsx', n_processos=None, progresso=None):
+    """Serializa os DataFrames ({nome: df}) em paralelo e grava cada um no ZIP assim que fica pronto."""
+    progresso = progresso or _sem_progresso
+    n_processos = min(n_processos or MAX_PROCESSOS, len(arquivos)) or 1
+    # xlsx e parquet já são comprimidos; só o CSV ganha com o deflate
+    compressao = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', compression=compressao) as zf:
+        if n_processos == 1:
+            for n, (nome, df) in enumerate(arquivos.items(), 1):
+                zf.writestr(trocar_extensao(nome, formato), exportar_bytes(df, formato))
+                progresso(n / len(arquivos), nome)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=n_processos, mp_context=contexto) as pool:
+                tarefas = {pool.submit(exportar_bytes, df, formato): nome for nome, df in arquivos.items()}
+                for n, tarefa in enumerate(as_completed(tarefas), 1):
+                    zf.writestr(trocar_extensao(tarefas[tarefa], formato), tarefa.result())
+                    progresso(n / len(tarefas), tarefas[tarefa])
+    return output.getvalue()
+
+def clean_column_names(df):
+    df.columns = df.columns.astype(str).str.strip().str.strip('.').str.replace(r'\s+', ' ', regex=True)
+    return df
+
+# Número decimal com sinal e expoente opcionais, como o Excel exporta códigos longos; o separador
+# decimal pode ser '.' ou ',' (exportações pt-BR: 7,89123E+12)
+_NUMERO_SKU = re.compile(r'[+-]?(?:[0-9]+[.,]?[0-9]*|[.,][0-9]+)(?:[eE][+-]?[0-9]+)?')
+
+def _sku_de_texto(texto):
+    if not _NUMERO_SKU.fullmatch(texto): return None
+    numero = Decimal(texto.replace(',', '.'))
+    if numero.adjusted() > 40: return None  # muito além de qualquer GTIN (e de um int gigante)
+    return str(int(numero))  # trunca a parte decimal, como a conversão para inteiro
+
+def limpar_sku_cientifico(serie):
+    """Códigos de barras como texto de inteiro: '7.89123E+12' (ou '7,89123E+12') vira '7891230000000' e '0789...' vira '789...'.
+
+    Textos são lidos como decimais exatos (sem passar por float), de modo que códigos longos não
+    perdem precisão; zeros à esquerda caem, e EAN-13 e GTIN-14 do mesmo produto coincidem. Valores
+    não numéricos viram NA, no mesmo índice da entrada.
+    """
+    resultado = pd.Series(np.nan, index=serie.index, dtype='str')
+    if pd.api.types.is_bool_dtype(serie.dtype): return resultado
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        validos = serie.notna().to_numpy()
+        resultado[validos] = serie[validos].astype(np.int64).astype('str')
+        return resultado
+    if pd.api.types.is_float_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        validos = np.isfinite(valores) & (np.abs(valores) < 2.0 ** 63)
+        resultado[validos] = valores[validos].astype(np.int64).astype(str)
+        return resultado
+    textos = serie.astype('str').str.strip()
+    # Caminho rápido (vetorizado): só dígitos. O resto (notação científica, sinal, decimais) vai por Decimal
+    digitos = textos.str.fullmatch(r'[0-9]+').fillna(False).to_numpy(dtype=bool)
+    resultado[digitos] = textos[digitos].str.lstrip('0').replace('', '0')
+    outros = textos.notna().to_numpy() & ~digitos
+    if outros.any():
+        codigos, unicos = pd.factorize(textos[outros])
+        convertidos = np.array([_sku_de_texto(t) for t in unicos] + [None], dtype=object)
+        resultado[outros] = convertidos[codigos]
+    return resultado
+
+def padronizar_texto_extrator(valor):
+    """Normaliza texto: Maiúsculo, Sem Acentos, Sem Pontos."""
+    if pd.isna(valor): return valor
+    texto = str(valor).upper()
+    texto_normalizado = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8')
+    texto_final = texto_normalizado.replace('.', '')
+    return texto_final.strip()
+
+def padronizar_serie_extrator(serie, categorica=False):
+    """Versão vetorizada de padronizar_texto_extrator: mesmo resultado, calculado uma vez por texto distinto.
+
+    Com categorica=True devolve um Categorical (um código por linha e cada texto guardado uma
+    única vez), indicado para atributos de baixa cardinalidade.
+    """
+    validos = serie.notna().to_numpy()
+    codigos_linhas = np.full(len(serie), -1, dtype=np.intp)
+    categorias = pd.Index([], dtype=object)
+    if validos.any():
+        # Colunas de texto são fatoradas direto; as demais pelo texto (1 e 1.0 são textos diferentes)
+        if isinstance(serie.dtype, pd.StringDtype): textos = serie[validos]
+        else: textos = _como_texto(serie.to_numpy(dtype=object)[validos])
+        codigos, unicos = pd.factorize(textos)
+        normalizados = pd.Series(unicos, dtype=object).str.upper().str.normalize('NFKD')
+        # Equivale ao encode('ASCII', 'ignore') + replace('.', ''): remove tudo que não é ASCII e os pontos
+        remover = {ord(c): None for c in set(''.join(normalizados)) if ord(c) > 127}
+        remover[ord('.')] = None
+        limpos = normalizados.str.translate(remover).str.strip()
+        # Textos diferentes podem ficar iguais depois de padronizados
+        codigos_limpos, categorias = pd.factorize(limpos)
+        codigos_linhas[validos] = codigos_limpos[codigos]
+    if categorica:
+        return pd.Series(pd.Categorical.from_codes(codigos_linhas, categories=categorias), index=serie.index, name=serie.name)
+    resultado = serie.to_numpy(dtype=object, copy=True)
+    resultado[validos] = categorias.to_numpy(dtype=object)[codigos_linhas[validos]]
+    # Vazios mantêm o valor original e o dtype final segue a mesma inferência do Series.apply
+    return pd.Series(resultado, index=serie.index, name=serie.name).infer_objects()
+
+# --- LEITURA (MOTOR DO EXCEL E PODA DE COLUNAS) ---
+# O calamine (python-calamine) lê xlsx/xls bem mais rápido que o openpyxl; sem ele, vale o padrão do pandas
+MOTOR_EXCEL = 'calamine' if importlib.util.find_spec('python_calamine') else None
+
+def normalizar_nome_coluna(nome):
+    """Mesma normalização de clean_column_names, aplicada a um único nome."""
+    return re.sub(r'\s+', ' ', str(nome).strip().strip('.'))
+
+class FiltroColunas:
+    """usecols para read_excel/read_csv: mantém as colunas cujo nome normalizado está em nomes.
+
+    Registra também o cabeçalho completo do arquivo (o pandas pode chamar o filtro mais de
+    uma vez por coluna), para que os diagnósticos continuem listando todas as colunas.
+    """
+
+    def __init__(self, nomes):
+        self.nomes = frozenset(nomes)
+        self.cabecalho = {}
+
+    def __call__(self, coluna):
+        self.cabecalho.setdefault(coluna, None)
+        return normalizar_nome_coluna(coluna) in self.nomes
+
+def _anexar_cabecalho(df, filtro):
+    if filtro is not None: df.attrs['colunas_arquivo'] = list(filtro.cabecalho)
+    return df
+
+def ler_excel(arquivo, colunas=None, **kwargs):
+    """pd.read_excel com o motor mais rápido disponível (recai no padrão se ele falhar).
+
+    Com colunas (nomes já normalizados), lê apenas as colunas necessárias.
+    """
+    filtro = FiltroColunas(colunas) if colunas else None
+    if filtro is not None: kwargs['usecols'] = filtro
+    if MOTOR_EXCEL:
+        try: return _anexar_cabecalho(pd.read_excel(arquivo, engine=MOTOR_EXCEL, **kwargs), filtro)
+        except Exception:
+            if hasattr(arquivo, 'seek'): arquivo.seek(0)
+    return _anexar_cabecalho(pd.read_excel(arquivo, **kwargs), filtro)
+
+def ler_arquivo_robusto(uploaded_file, colunas=None):
+    filename = uploaded_file.name.lower()
+    if filename.endswith(('.xlsx', '.xls')):
+        try: return ler_excel(uploaded_file, colunas)
+        except Exception as e: return None
+
+    if filename.endswith('.csv'):
+        encoding_detectado, separador = detectar_formato_csv(uploaded_file)
+        filtro = FiltroColunas(colunas) if colunas else None
+        try:
+            return _anexar_cabecalho(pd.read_csv(uploaded_file, encoding=encoding_detectado, sep=separador, usecols=filtro), filtro)
+        except Exception:
+            try:
+                uploaded_file.seek(0)
+                return _anexar_cabecalho(pd.read_csv(uploaded_file, encoding='latin1', sep=separador, usecols=filtro), filtro)
+            except:
+                return None
+    return None
+
+def ler_amostra_arquivo(uploaded_file, n_linhas=5):
+    """Lê apenas o cabeçalho e as primeiras linhas (pré-visualização), sem carregar o arquivo todo."""
+    filename = uploaded_file.name.lower()
+    try:
+        if filename.endswith(('.xlsx', '.xls')): return ler_excel(uploaded_file, nrows=n_linhas)
+        if filename.endswith('.csv'):
+            encoding_detectado, separador = detectar_formato_csv(uploaded_file)
+            return pd.read_csv(uploaded_file, encoding=encoding_detectado, sep=separador,
+                               nrows=n_linhas, encoding_errors='replace')
+    except Exception:
+        return None
+    finally:
+        uploaded_file.seek(0)
+    return None
+
+# --- CACHE DE UPLOADS (CONTEÚDO JÁ LIDO) ---
+def _conteudo_arquivo(uploaded_file):
+    if hasattr(uploaded_file, 'getvalue'): return uploaded_file.getvalue()
+    uploaded_file.seek(0)
+    dados = uploaded_file.read()
+    uploaded_file.seek(0)
+    return dados
+
+def _chave_upload(uploaded_file, dados, tipo):
+    extensao = os.path.splitext(uploaded_file.name.lower())[1]
+    return (hashlib.sha256(dados).hexdigest(), extensao, tipo)
+
+def ler_arquivo_cacheado(uploaded_file, colunas=None):
+    """ler_arquivo_robusto com cache por conteúdo: o mesmo arquivo é lido uma única vez.
+
+    Devolve uma cópia, pois os chamadores renomeiam e alteram colunas.
+    """
+    dados = _conteudo_arquivo(uploaded_file)
+    tipo = ('colunas', tuple(sorted(colunas))) if colunas else 'completo'
+    chave = _chave_upload(uploaded_file, dados, tipo)
+    df = CACHE_UPLOADS.obter(chave, lambda: ler_arquivo_robusto(uploaded_file, colunas), peso=peso_df)
+    uploaded_file.seek(0)
+    return None if df is None else df.copy()
+
+def peso_df(df):
+    """Memória ocupada pelo DataFrame em bytes (0 para None), usada como peso nos caches."""
+    return 0 if df is None else int(df.memory_usage(deep=True).sum())
+
+def ler_amostra_cacheada(uploaded_file, n_linhas=5):
+    """Amostra para pré-visualização; reaproveita a leitura completa se ela já estiver em cache."""
+    dados = _conteudo_arquivo(uploaded_file)
+    completo = CACHE_UPLOADS.consultar(_chave_upload(uploaded_file, dados, 'completo'))
+    if completo is not None: return completo.head(n_linhas).copy()
+    chave = _chave_upload(uploaded_file, dados, f'amostra-{n_linhas}')
+    df = CACHE_UPLOADS.obter(chave, lambda: ler_amostra_arquivo(uploaded_file, n_linhas), peso=0)
+    return None if df is None else df.copy()
+
+# --- LEITURA DE CSV: DETECÇÃO POR AMOSTRA E LEITURA EM BLOCOS ---
+TAMANHO_AMOSTRA_CSV = 64 * 1024
+
+def detectar_formato_csv(arquivo, tamanho_amostra=TAMANHO_AMOSTRA_CSV):
+    """Encoding e separador do CSV a partir de uma amostra do início (o arquivo volta à posição 0).
+
+    Mesma preferência da leitura completa que substitui: tabulação, depois ';' e por fim ','.
+    """
+    amostra = arquivo.read(tamanho_amostra)
+    arquivo.seek(0)
+    encoding_detectado = 'utf-8'
+    if amostra.startswith(b'\xff\xfe'): encoding_detectado = 'utf-16'
+    elif amostra.startswith(b'\xfe\xff'): encoding_detectado = 'utf-16-be'
+    elif amostra.startswith(b'\xef\xbb\xbf'): encoding_detectado = 'utf-8-sig'
+
+    # Decodificador incremental: a amostra pode terminar no meio de um caractere multibyte
+    try:
+        texto = codecs.getincrementaldecoder(encoding_detectado)().decode(amostra, final=False)
+    except UnicodeDecodeError:
+        encoding_detectado = 'latin1'
+        texto = amostra.decode('latin1')
+
+    linhas = texto.splitlines()
+    cabecalho = linhas[0] if linhas else ''
+    for separador in ('\t', ';'):
+        if len(next(csv.reader([cabecalho], delimiter=separador))) > 1: return encoding_detectado, separador
+    return encoding_detectado, ','
+
+def ler_csv_em_blocos(arquivo, tamanho_bloco=100_000):
+    """Gera DataFrames de até tamanho_bloco linhas com uma única passada pelo arquivo."""
+    encoding_detectado, separador = detectar_formato_csv(arquivo)
+    # Em fluxo não há como recomeçar com outro encoding: bytes inválidos viram '\ufffd'
+    leitor = pd.read_csv(arquivo, encoding=encoding_detectado, sep=separador,
+                         chunksize=tamanho_bloco, encoding_errors='replace')
+    with leitor:
+        for bloco in leitor: yield bloco
+
+def classificar_em_fluxo(arquivo, regras_otimizadas, config_industria, destino, destino_mudancas=None,
+                         tamanho_bloco=100_000, progresso=None, armazem=None, escopo=''):
+    """Classifica um CSV bloco a bloco, gravando os resultados (CSV ';') à medida que avança.
+
+    A memória fica limitada ao tamanho do bloco, qualquer que seja o tamanho da entrada.
+    Retorna (linhas processadas, mudanças registradas).
+    """
+    progresso = progresso or _sem_progresso
+    arquivo.seek(0, os.SEEK_END)
+    tamanho_total = arquivo.tell() or 1
+    arquivo.seek(0)
+
+    total_linhas = total_mudancas = 0
+    saida_mudancas = open(destino_mudancas, 'w', encoding='utf-8-sig', newline='') if destino_mudancas else None
+    try:
+        with open(destino, 'w', encoding='utf-8-sig', newline='') as saida:
+            for bloco in ler_csv_em_blocos(arquivo, tamanho_bloco):
+                bloco.columns = bloco.columns.astype(str).str.strip()
+                if COL_NOME_SKU not in bloco.columns:
+                    raise ValueError(f"A planilha deve conter a coluna '{COL_NOME_SKU}'.")
+                df_bloco, df_comp = processar_dataframe_classificador(
+                    bloco, regras_otimizadas, config_industria, armazem=armazem, escopo=escopo, copiar=False
+                )
+                df_bloco.to_csv(saida, sep=';', index=False, header=total_linhas == 0)
+
+                if saida_mudancas is not None and not df_comp.empty:
+                    # Sem coluna de código de barras, o SKU ID é a posição da linha no arquivo inteiro
+                    if SKU_PADRAO_FINAL not in bloco.columns: df_comp['SKU ID'] += total_linhas
+                    df_comp.to_csv(saida_mudancas, sep=';', index=False, header=total_mudancas == 0)
+
+                total_linhas += len(df_bloco)
+                total_mudancas += len(df_comp)
+                progresso(min(arquivo.tell() / tamanho_total, 1.0), f"{total_linhas} linhas classificadas...")
+    finally:
+        if saida_mudancas is not None: saida_mudancas.close()
+    return total_linhas, total_mudancas
+
+# --- CARREGAMENTO DE DICIONÁRIOS COM CACHE ---
+# Dois níveis: memória (chave = caminho, mtime e tamanho, sem reler o arquivo) e disco
+# (chave = hash do conteúdo), que sobrevive a reinícios e evita o read_excel e a compilação.
+# Únicas colunas do dicionário usadas pelo motor (as demais nem são lidas)
+COLUNAS_REGRAS = ['Tipo de Regra', 'Valor da Regra', 'Interpretação', 'Grau de Associação']
+
+def carregar_dicionario_industria(nome_arquivo):
+    caminho_completo = os.path.join(PASTA_DICIONARIOS, nome_arquivo)
+    if not os.path.exists(caminho_completo):
+        return None, f"⚠️ Arquivo não encontrado: {caminho_completo}"
+    estado = os.stat(caminho_completo)
+    chave = (caminho_completo, estado.st_mtime_ns, estado.st_size)
+    return CACHE_DICIONARIOS.obter(chave, lambda: _ler_dicionario(caminho_completo, nome_arquivo))
+
+def _ler_dicionario(caminho_completo, nome_arquivo):
+    try:
+        nome_base = os.path.splitext(nome_arquivo)[0]
+        chave_disco = f"{nome_base}-{hash_arquivo(caminho_completo)[:20]}-v{VERSAO_CACHE_DISCO}"
+        return CACHE_DISCO.obter(chave_disco, lambda: _validar_dicionario(ler_excel(caminho_completo, COLUNAS_REGRAS))), None
+    except Exception as e:
+        return None, f"Erro ao ler o arquivo {nome_arquivo}: {e}"
+
+def _validar_dicionario(df):
+    df = df.dropna(subset=['Valor da Regra'])
+    return df[df['Valor da Regra'].astype(str).str.strip() != '']
+
+def otimizar_regras(df_dict, protegido=PROTEGER_REGEX):
+    """Regras compiladas por coluna. No modo protegido, as regex suspeitas de backtracking
+    catastrófico recebem limite de tempo por busca ou, sem o módulo regex, as que estouram
+    o limite na sondagem ficam em quarentena (ver diagnosticar_regras)."""
+    if df_dict is None or not all(col in df_dict.columns for col in COLUNAS_REGRAS):
+        return None
+    orcamento_ms = ORCAMENTO_REGEX_MS if protegido else None
+    chave = impressao_digital_df(df_dict[COLUNAS_REGRAS])
+    # A proteção (e se há módulo regex) muda as regras geradas, então entra na chave
+    sufixo = f"-p{orcamento_ms}{f'r{MAX_ESTOUROS_REGEX}' if _regex else 'q'}" if protegido else ""
+    chave_disco = f"regras-{chave[:20]}{sufixo}-v{VERSAO_CACHE_DISCO}"
+    return CACHE_REGRAS.obter(
+        (chave, orcamento_ms), lambda: CACHE_DISCO.obter(chave_disco, lambda: _compilar_regras(df_dict, orcamento_ms))
+    )
+
+def regex_invalidas(df_dict):
+    """Regras cujo 'Valor da Regra' não compila: lista de (Tipo de Regra, padrão, erro)."""
+    invalidas = []
+    for tipo, padrao in zip(df_dict['Tipo de Regra'], df_dict['Valor da Regra'].astype(str)):
+        try: re.compile(padrao, re.IGNORECASE)
+        except re.error as e: invalidas.append((str(tipo).strip(), padrao, str(e)))
+    return invalidas
+
+# --- PRÉ-CARREGAMENTO (WARM-UP) ---
+def _aquecer_dicionario(industria, categoria, nome_arquivo):
+    info = {'Indústria': industria, 'Categoria': categoria, 'Arquivo': nome_arquivo,
+            'Regras': 0, 'Regex Inválidas': 0, 'Regex Suspeitas': 0, 'Carga (s)': 0.0, 'Compilação (s)': 0.0, 'Erro': None}
+    inicio = time.perf_counter()
+    df_dict, erro = carregar_dicionario_industria(nome_arquivo)
+    info['Carga (s)'] = round(time.perf_counter() - inicio, 3)
+    if erro:
+        info['Erro'] = erro
+        return info
+    inicio = time.perf_counter()
+    regras = otimizar_regras(df_dict)
+    info['Compilação (s)'] = round(time.perf_counter() - inicio, 3)
+    if regras is None:
+        info['Erro'] = "Colunas de regra obrigatórias ausentes."
+        return info
+    info['Regras'] = sum(len(lista) for lista in regras.values())
+    info['Regex Inválidas'] = len(regex_invalidas(df_dict))
+    info['Regex Suspeitas'] = len(diagnosticar_regras(df_dict))
+    return info
+
+def aquecer_dicionarios(config_classificador, max_threads=4):
+    """Carrega e compila todos os dicionários configurados; retorna um relatório por arquivo."""
+    tarefas = [(ind, cat, arq) for ind, cfg in config_classificador.items() for cat, arq in cfg['arquivos'].items()]
+    with ThreadPoolExecutor(max_workers=max_threads) as pool:
+        return list(pool.map(lambda t: _aquecer_dicionario(*t), tarefas))
+
+class RegexPreguicosa:
+    """Regex validada na criação, mas serializada só pela expressão e recompilada no primeiro uso.
+
+    Assim o cache em disco carrega instantaneamente e apenas as regras que chegam a ser
+    candidatas (ver classificar_por_indice) pagam o custo do re.compile.
+    """
+    __slots__ = ('pattern', 'flags', '_compilada')
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compilada = re.compile(pattern, flags)
+
+    def search(self, texto):
+        if self._compilada is None: self._compilada = re.compile(self.pattern, self.flags)
+        return self._compilada.search(texto)
+
+    def __getstate__(self):
+        return (self.pattern, self.flags)
+
+    def __setstate__(self, estado):
+        self.pattern, self.flags = estado
+        self._compilada = None
+
+class RegexProtegida(RegexPreguicosa):
+    """Regex suspeita executada pelo módulo regex com limite de tempo por busca.
+
+    search trata o estouro do limite como "não reconheceu"; buscar_com_limite deixa o TimeoutError
+    passar, para que classificar_por_indice conte os estouros da execução e, depois de max_estouros,
+    ponha a regra em quarentena (disjuntor). A regra em si não guarda estado: é compartilhada
+    pelo cache entre execuções e sessões.
+    """
+    __slots__ = ('orcamento_s', 'max_estouros')
+
+    def __init__(self, pattern, flags, orcamento_s, max_estouros=MAX_ESTOUROS_REGEX):
+        super().__init__(pattern, flags)  # valida com o re, como as demais regras
+        self.orcamento_s = orcamento_s
+        self.max_estouros = max_estouros
+        self._compilada = None
+
+    def buscar_com_limite(self, texto):
+        if self._compilada is None: self._compilada = _regex.compile(self.pattern, self.flags)
+        return self._compilada.search(texto, timeout=self.orcamento_s)
+
+    def search(self, texto):
+        try: return self.buscar_com_limite(texto)
+        except TimeoutError: return None
+
+    def __getstate__(self):
+        return (self.pattern, self.flags, self.orcamento_s, self.max_estouros)
+
+    def __setstate__(self, estado):
+        self.pattern, self.flags, self.orcamento_s, self.max_estouros = estado
+        self._compilada = None
+
+def _buscar_protegida(padrao, ids, textos, contadores):
+    """Ids cujo texto a regra protegida reconhece, contando em contadores ([estouros, ignoradas],
+    da execução) os estouros do limite e, depois de max_estouros, as buscas puladas na quarentena."""
+    casaram = []
+    for n, i in enumerate(ids):
+        if contadores[0] >= padrao.max_estouros:
+            contadores[1] += len(ids) - n
+            break
+        try:
+            if padrao.buscar_com_limite(textos[i]): casaram.append(i)
+        except TimeoutError:
+            contadores[0] += 1
+    return casaram
+
+# --- REGEX LENTAS (BACKTRACKING CATASTRÓFICO) ---
+# A análise estática aponta as construções de risco exponencial; a sondagem mede a regra em
+# entradas adversárias de tamanho crescente e para no primeiro estouro do orçamento.
+_BOMBAS = ('a', '1', ' ', 'a ', 'ab', 'a1', '.', '-')
+
+def _primeiros_caracteres(itens):
+    """Caracteres (minúsculos) com que a sequência pode começar, ou None se forem quaisquer/desconhecidos."""
+    if not itens: return None  # sequência vazia: alternativa que casa com ""
+    op, av = itens[0]
+    if op == sre_constants.LITERAL: return {chr(av).lower()}
+    if op == sre_constants.IN and all(o == sre_constants.LITERAL for o, _ in av): return {chr(v).lower() for _, v in av}
+    if op == sre_constants.SUBPATTERN: return _primeiros_caracteres(list(av[3]))
+    if op == sre_constants.BRANCH:
+        conjuntos = [_primeiros_caracteres(list(alt)) for alt in av[1]]
+        return None if any(c is None for c in conjuntos) else set().union(*conjuntos)
+    if op in _REPETICOES and av[0] >= 1: return _primeiros_caracteres(list(av[2]))
+    return None
+
+def _alternativas_sobrepostas(itens):
+    """Há, nesta sequência, uma alternância cujas opções podem começar pelo mesmo caractere?"""
+    for op, av in itens:
+        if op == sre_constants.SUBPATTERN and _alternativas_sobrepostas(list(av[3])): return True
+        if op != sre_constants.BRANCH: continue
+        vistos = set()
+        for alternativa in av[1]:
+            primeiros = _primeiros_caracteres(list(alternativa))
+            if primeiros is None or vistos & primeiros: return True
+            vistos |= primeiros
+    return False
+
+def _analisar_itens(itens, max_externo, problemas):
+    for op, av in itens:
+        if op in _REPETICOES:
+            minimo, maximo, corpo = av
+            ilimitada = maximo == sre_constants.MAXREPEAT
+            if max_externo > 1 and maximo > 1 and (ilimitada or max_externo == sre_constants.MAXREPEAT):
+                problemas.add("Quantificadores aninhados (ex.: (a+)+)")
+            if ilimitada and _alternativas_sobrepostas(list(corpo)):
+                problemas.add("Alternativas sobrepostas sob quantificador (ex.: (a|ab)+)")
+            _analisar_itens(list(corpo), max(max_externo, maximo), problemas)
+        elif op == sre_constants.SUBPATTERN:
+            _analisar_itens(list(av[3]), max_externo, problemas)
+        elif op == sre_constants.BRANCH:
+            for alternativa in av[1]: _analisar_itens(list(alternativa), max_externo, problemas)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _analisar_itens(list(av[1]), max_externo, problemas)
+        # Repetições possessivas e grupos atômicos (3.11+) não retrocedem: não são analisados
+
+def analisar_regex(padrao):
+    """Construções com risco de backtracking catastrófico encontradas na regex (lista vazia: nenhuma)."""
+    try: arvore = sre_parse.parse(padrao, re.IGNORECASE)
+    except Exception: return []
+    problemas = set()
+    _analisar_itens(list(arvore), 0, problemas)
+    return sorted(problemas)
+
+def sondar_regex(padrao, orcamento_s, tamanhos=range(8, 33, 2)):
+    """Pior tempo (s) de uma busca em entradas adversárias de tamanho crescente.
+
+    Cresce de 2 em 2 caracteres e para no primeiro estouro, de modo que mesmo uma regex
+    exponencial custa no máximo algumas vezes o orçamento.
+    """
+    compilada = re.compile(padrao, re.IGNORECASE)
+    prefixos = [''] + sorted(extrair_literais(padrao) or ())
+    pior = 0.0
+    for prefixo in prefixos:
+        for bomba in _BOMBAS:
+            for n in tamanhos:
+                texto = f"{prefixo}{bomba * n}!"
+                inicio = time.perf_counter()
+                compilada.search(texto)
+                pior = max(pior, time.perf_counter() - inicio)
+                if pior > orcamento_s: return pior
+    return pior
+
+def _regex_da_regra(padrao, orcamento_ms):
+    """Objeto de busca da regra; None quando ela vai para a quarentena."""
+    if orcamento_ms is None or not analisar_regex(padrao): return RegexPreguicosa(padrao, re.IGNORECASE)
+    if _regex is not None: return RegexProtegida(padrao, re.IGNORECASE, orcamento_ms / 1000)
+    if sondar_regex(padrao, orcamento_ms / 1000) > orcamento_ms / 1000: return None
+    return RegexPreguicosa(padrao, re.IGNORECASE)
+
+def diagnosticar_regras(df_dict, orcamento_ms=ORCAMENTO_REGEX_MS):
+    """Regras suspeitas de backtracking catastrófico, com o pior tempo na sondagem e a situação no modo protegido."""
+    chave = ('diagnostico', impressao_digital_df(df_dict[COLUNAS_REGRAS]), orcamento_ms)
+    return CACHE_REGRAS.obter(chave, lambda: _diagnosticar_regras(df_dict, orcamento_ms))
+
+def _diagnosticar_regras(df_dict, orcamento_ms):
+    linhas = []
+    colunas = zip(df_dict['Tipo de Regra'], df_dict['Valor da Regra'].astype(str), df_dict['Interpretação'])
+    for tipo, padrao, interpretacao in colunas:
+        problemas = analisar_regex(padrao)
+        if not problemas: continue
+        pior = sondar_regex(padrao, orcamento_ms / 1000)
+        if _regex is not None: situacao = "Protegida (limite de tempo)"
+        elif pior > orcamento_ms / 1000: situacao = "Quarentena"
+        else: situacao = "Suspeita (sondagem dentro do limite)"
+        linhas.append({'Tipo de Regra': str(tipo).strip(), 'Valor da Regra': padrao, 'Interpretação': interpretacao,
+                       'Problemas': "; ".join(problemas), 'Pior Tempo (ms)': round(pior * 1000, 2), 'Situação': situacao})
+    colunas = ['Tipo de Regra', 'Valor da Regra', 'Interpretação', 'Problemas', 'Pior Tempo (ms)', 'Situação']
+    return pd.DataFrame(linhas, columns=colunas)
+
+def custo_regras(regras_otimizadas, descricoes):
+    """Custo de cada regra em uma amostra de descrições (todas as regras em todas as descrições, sem pré-filtro)."""
+    textos = [str(d) for d in descricoes if pd.notna(d)]
+    linhas = []
+    for coluna, lista in regras_otimizadas.items():
+        for regra in lista:
+            total, pior, acertos = 0.0, 0.0, 0
+            for texto in textos:
+                inicio = time.perf_counter()
+                casou = regra['pattern'].search(texto)
+                duracao = time.perf_counter() - inicio
+                total += duracao
+                pior = max(pior, duracao)
+                acertos += casou is not None
+            linhas.append({'Coluna': coluna, 'Padrão': regra['pattern'].pattern, 'Interpretação': regra['value'],
+                           'Tempo Total (ms)': round(total * 1000, 3), 'Pior Busca (ms)': round(pior * 1000, 3),
+                           'Acertos na Amostra': acertos})
+    colunas = ['Coluna', 'Padrão', 'Interpretação', 'Tempo Total (ms)', 'Pior Busca (ms)', 'Acertos na Amostra']
+    return pd.DataFrame(linhas, columns=colunas).sort_values('Tempo Total (ms)', ascending=False, ignore_index=True)
+
+def _compilar_regras(df_dict, orcamento_ms=None):
+    regras_otimizadas = {}
+    for _, row in df_dict.iterrows():
+        tipo_regra = str(row['Tipo de Regra']).strip()
+        regex_pattern = str(row['Valor da Regra'])
+        interpretacao = row['Interpretação']
+        score = row['Grau de Associação'] if pd.notna(row['Grau de Associação']) else 0
+        
+        if tipo_regra not in regras_otimizadas: regras_otimizadas[tipo_regra] = []
+        try:
+            padrao_compilado = _regex_da_regra(regex_pattern, orcamento_ms)
+            if padrao_compilado is None: continue  # quarentena (ver diagnosticar_regras)
+            regras_otimizadas[tipo_regra].append({
+                'pattern': padrao_compilado,
+                'value': interpretacao,
+                'score': int(score),
+                'literais': extrair_literais(regex_pattern),
+                'exatos': literais_exatos(regex_pattern)
+            })
+        except re.error: continue
+
+    # Ordem decrescente de score (estável: no empate vale a ordem do dicionário), de modo que a
+    # primeira regra que reconhece a descrição é a vencedora. Regras com score negativo nunca
+    # venciam a comparação com o score inicial (-1) e são descartadas.
+    for tipo_regra, lista in regras_otimizadas.items():
+        regras_otimizadas[tipo_regra] = sorted((r for r in lista if r['score'] >= 0), key=lambda r: -r['score'])
+    return regras_otimizadas
+
+# --- MOTOR DE CORRESPONDÊNCIA (PRÉ-FILTRO POR LITERAIS) ---
+# Cada regra recebe o conjunto de literais dos quais ao menos um aparece obrigatoriamente
+# em qualquer texto que ela reconheça: só as descrições que contêm algum deles (ver
+# IndiceInvertido) são candidatas e executam a regex de fato.
+
+# Caracteres que o re.IGNORECASE equipara a 'i'/'s' mas que o str.lower() não converte
+_TABELA_CASO = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's'})
+_REPETICOES = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'): _REPETICOES.add(sre_constants.POSSESSIVE_REPEAT)
+
+def canonizar_texto(texto):
+    """Forma usada pelo pré-filtro: minúsculas com as equivalências do re.IGNORECASE."""
+    return texto.translate(_TABELA_CASO).lower()
+
+def _caractere_seguro(codigo):
+    # ASCII e letras Latin-1: o re.IGNORECASE não tem equivalências além das tratadas acima
+    return codigo < 0x80 or 0xC0 <= codigo <= 0xFF
+
+def _literais_sequencia(sequencia):
+    candidatos = []
+    trecho = []
+
+    def fechar_trecho():
+        if trecho: candidatos.append({''.join(trecho)})
+        trecho.clear()
+
+    for op, av in sequencia:
+        if op is sre_constants.LITERAL and _caractere_seguro(av):
+            trecho.append(canonizar_texto(chr(av)))
+            continue
+        fechar_trecho()
+        if op is sre_constants.SUBPATTERN:
+            sub = _literais_sequencia(av[-1])
+        elif op is sre_constants.BRANCH:
+            ramos = [_literais_sequencia(ramo) for ramo in av[1]]
+            sub = None if any(r is None for r in ramos) else set().union(*ramos)
+        elif op in _REPETICOES and av[0] >= 1:
+            sub = _literais_sequencia(av[2])
+        else:
+            sub = None
+        if sub: candidatos.append(sub)
+    fechar_trecho()
+
+    if not candidatos: return None
+    # Prefere o conjunto mais seletivo: literal mínimo mais longo e menos alternativas
+    return max(candidatos, key=lambda c: (min(len(l) for l in c), -len(c)))
+
+def extrair_literais(regex_pattern):
+    """Literais obrigatórios (canonizados) da regex, ou None quando não há pré-filtro seguro."""
+    try:
+        literais = _literais_sequencia(sre_parse.parse(regex_pattern, re.IGNORECASE))
+    except Exception:
+        return None
+    return frozenset(literais) if literais else None
+
+def _textos_exatos(itens):
+    """Todos os textos que a sequência reconhece, quando ela é feita só de literais e alternâncias."""
+    textos = {''}
+    for op, av in itens:
+        if op is sre_constants.LITERAL and _caractere_seguro(av): opcoes = {canonizar_texto(chr(av))}
+        elif op is sre_constants.IN and all(o is sre_constants.LITERAL and _caractere_seguro(v) for o, v in av):
+            opcoes = {canonizar_texto(chr(v)) for _, v in av}
+        elif op is sre_constants.SUBPATTERN and not av[1] and not av[2]: opcoes = _textos_exatos(av[-1])
+        elif op is sre_constants.BRANCH:
+            ramos = [_textos_exatos(ramo) for ramo in av[1]]
+            opcoes = None if any(r is None for r in ramos) else set().union(*ramos)
+        else: opcoes = None
+        if opcoes is None: return None
+        textos = {t + o for t in textos for o in opcoes}
+        if len(textos) > 64: return None
+    return textos
+
+def literais_exatos(regex_pattern):
+    """Literais (canonizados) quando a regex é só um literal ou uma alternância de literais
+    (ex.: 'WAFER|WAFFER'): reconhecer a descrição equivale a contê-los. None nos demais casos."""
+    try:
+        textos = _textos_exatos(sre_parse.parse(regex_pattern, re.IGNORECASE))
+    except Exception:
+        return None
+    return frozenset(textos) if textos and '' not in textos else None
+
+def _regex_trie(literais):
+    trie = {}
+    for literal in literais:
+        no = trie
+        for ch in literal: no = no.setdefault(ch, {})
+        no[None] = True
+
+    def emitir(no):
+        filhos = [re.escape(ch) + emitir(sub) for ch, sub in sorted((k, v) for k, v in no.items() if k is not None)]
+        if not filhos: return ''
+        corpo = filhos[0] if len(filhos) == 1 else '(?:' + '|'.join(filhos) + ')'
+        return f'(?:{corpo})?' if None in no else corpo
+
+    return emitir(trie)
+
+def compilar_motor_regras(regras_lista):
+    """Motor de uma lista de regras: as regras (em ordem de score) e os literais que elas consultam
+    no índice invertido (ver IndiceInvertido e classificar_por_indice)."""
+    return {
+        'regras': regras_lista,
+        'literais_indice': frozenset().union(*(r.get('exatos') or r.get('literais') or () for r in regras_lista)),
+    }
+
+# --- ÍNDICE INVERTIDO (AVALIAÇÃO REGRA A REGRA) ---
+# Uma varredura por descrição monta o índice literal -> descrições que o contêm, compartilhado por
+# todos os atributos. Depois cada regra, em ordem de score, só olha as descrições pendentes que
+# contêm seus literais: as exatas (só literais) são resolvidas pelo próprio índice e as demais
+# executam a regex apenas nessas candidatas.
+
+class IndiceInvertido:
+    """Índice literal (canonizado) -> ids das descrições que o contêm como trecho."""
+
+    def __init__(self, descricoes, literais):
+        self.textos = [str(d) for d in descricoes]
+        # O índice só dispensa a regex em textos ASCII, onde minúsculas e re.IGNORECASE coincidem
+        self.ascii = np.fromiter((t.isascii() for t in self.textos), dtype=bool, count=len(self.textos))
+        self._ids = {}
+        if not literais: return
+        varredor = re.compile('(?=(' + _regex_trie(literais) + '))')
+        prefixos = {}
+        posicoes = {}
+        for i, texto in enumerate(self.textos):
+            encontrados = set()
+            for literal in set(varredor.findall(canonizar_texto(texto))):
+                if literal not in prefixos:
+                    prefixos[literal] = [literal[:n] for n in range(1, len(literal) + 1) if literal[:n] in literais]
+                encontrados.update(prefixos[literal])
+            for literal in encontrados:
+                if literal not in posicoes: posicoes[literal] = array('q')
+                posicoes[literal].append(i)
+        self._ids = {literal: np.frombuffer(ids, dtype=np.int64) for literal, ids in posicoes.items()}
+
+    def __len__(self):
+        return len(self.textos)
+
+    def ids(self, literais):
+        """Ids (ordenados) das descrições que contêm ao menos um dos literais."""
+        partes = [self._ids[l] for l in literais if l in self._ids]
+        if len(partes) <= 1: return partes[0] if partes else np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(partes))
+
+def classificar_por_indice(motor, indice, estatisticas=None, falhas=None):
+    """Resultado de cada descrição do índice, avaliando regra a regra em ordem de score.
+
+    Equivale a testar, em cada descrição, todas as regras em ordem: a primeira (maior score) que
+    reconhece a descrição é a vencedora, e ela deixa de ser avaliada pelas regras seguintes.
+    falhas ({índice: [estouros, ignoradas]}) guarda o estado do disjuntor das regras protegidas
+    nesta execução (ver RegexProtegida): passe o mesmo dict a cada bloco da execução. Havendo
+    alguma busca sem resposta, o resultado está degradado.
+    """
+    falhas = {} if falhas is None else falhas
+    resultados = np.full(len(indice), None, dtype=object)
+    pendentes = np.ones(len(indice), dtype=bool)
+    restantes = len(indice)
+    for idx, regra in enumerate(motor['regras']):
+        if not restantes: break
+        inicio = time.perf_counter()
+        exatos = regra.get('exatos')
+        literais = exatos or regra.get('literais')
+        if literais:
+            candidatos = indice.ids(literais)
+            candidatos = candidatos[pendentes[candidatos]]
+        else:
+            candidatos = np.flatnonzero(pendentes)
+        if exatos:
+            casaram = candidatos[indice.ascii[candidatos]]
+            verificar = candidatos[~indice.ascii[candidatos]]
+        else:
+            casaram = candidatos[:0]
+            verificar = candidatos
+        if len(verificar):
+            padrao = regra['pattern']
+            if isinstance(padrao, RegexProtegida):
+                novos = _buscar_protegida(padrao, verificar.tolist(), indice.textos, falhas.setdefault(idx, [0, 0]))
+            else:
+                novos = [i for i in verificar.tolist() if padrao.search(indice.textos[i])]
+            casaram = np.concatenate([casaram, novos]).astype(np.int64)
+        if len(casaram):
+            resultados[casaram] = regra['value']
+            pendentes[casaram] = False
+            restantes -= len(casaram)
+        if estatisticas is not None and len(candidatos):
+            contadores = estatisticas.setdefault(idx, [0, 0, 0.0])
+            contadores[0] += len(candidatos)
+            contadores[1] += len(casaram)
+            contadores[2] += time.perf_counter() - inicio
+    return resultados.tolist()
+
+def classificar_com_indice(motores, descricoes, tamanho_bloco=TAMANHO_BLOCO_INDICE, ao_progredir=None, instrumentacao=None,
+                           falhas=None):
+    """Classifica as descrições em todos os atributos com um índice invertido por bloco.
+
+    falhas ({coluna: {índice: [estouros, ignoradas]}}) acumula as buscas sem resposta (ver classificar_por_indice).
+    """
+    resultados = {col: [] for col in motores}
+    falhas = {} if falhas is None else falhas  # um disjuntor por regra em toda a execução, não por bloco
+    literais = frozenset().union(*(motor['literais_indice'] for motor in motores.values()))
+    inicios = range(0, len(descricoes), tamanho_bloco)
+    for n, inicio in enumerate(inicios, 1):
+        with medir_etapa(instrumentacao, "Índice invertido"):
+            indice = IndiceInvertido(descricoes[inicio:inicio + tamanho_bloco], literais)
+        for col, motor in motores.items():
+            with medir_etapa(instrumentacao, "Classificação", col):
+                estatisticas = instrumentacao.estatisticas_regras(col, motor['regras']) if instrumentacao else None
+                resultados[col] += classificar_por_indice(motor, indice, estatisticas, falhas.setdefault(col, {}))
+            if ao_progredir: ao_progredir((n - 1 + (list(motores).index(col) + 1) / len(motores)) / len(inicios), col)
+    return resultados
+
+def fatorar_textos(serie):
+    """Códigos por linha (-1 para vazios) e a lista de textos distintos da série."""
+    validos = serie.notna().to_numpy()
+    codigos = np.full(len(serie), -1, dtype=np.intp)
+    # Fatora o texto (str) e não o valor bruto: 1 e 1.0 seriam o mesmo valor, mas textos diferentes
+    codigos_validos, unicos = pd.factorize(serie[validos].astype(str))
+    codigos[validos] = codigos_validos
+    return codigos, list(unicos)
+
+_como_texto = np.frompyfunc(str, 1, 1)
+
+def somar_falhas(falhas, parciais):
+    """Acumula contadores {índice: [estouros, ignoradas]} (ex.: vindos de outro processo)."""
+    for idx, (estouros, ignoradas) in parciais.items():
+        atual = falhas.setdefault(idx, [0, 0])
+        atual[0] += estouros; atual[1] += ignoradas
+
+# --- CLASSIFICAÇÃO PARALELA (POOL DE PROCESSOS) ---
+# Os motores compilados são enviados uma única vez a cada processo (initializer); as tarefas
+# carregam apenas o nome da coluna e um bloco de descrições distintas.
+_MOTORES_PROCESSO = {}
+
+def _inicializar_processo(motores):
+    _MOTORES_PROCESSO.update(motores)
+
+def _classificar_bloco(col_alvo, descricoes, medir=False):
+    """Tarefa do pool: devolve (resultados, estatísticas ou None, falhas)."""
+    motor = _MOTORES_PROCESSO[col_alvo]
+    estatisticas = {} if medir else None
+    falhas = {}
+    resultados = classificar_por_indice(motor, IndiceInvertido(descricoes, motor['literais_indice']), estatisticas, falhas)
+    return resultados, estatisticas, falhas
+
+def classificar_em_paralelo(motores, descricoes_unicas, n_processos, tamanho_bloco=TAMANHO_BLOCO_PARALELO, ao_progredir=None,
+                            instrumentacao=None, falhas=None):
+    """Classifica as descrições em todos os atributos, dividindo por coluna e por bloco de linhas.
+
+    falhas ({coluna: {índice: [estouros, ignoradas]}}) acumula as buscas sem resposta dos processos
+    (cada bloco roda com o próprio disjuntor, pois os blocos são avaliados ao mesmo tempo).
+    """
+    resultados = {col: [None] * len(descricoes_unicas) for col in motores}
+    medir = instrumentacao is not None
+    if medir:
+        for col, motor in motores.items(): instrumentacao.estatisticas_regras(col, motor['regras'])
+    inicios = range(0, len(descricoes_unicas), tamanho_bloco)
+    # 'spawn' evita herdar por fork o estado (threads, locks) do servidor Streamlit
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_processos, mp_context=contexto,
+                             initializer=_inicializar_processo, initargs=(motores,)) as pool:
+        tarefas = {
+            pool.submit(_classificar_bloco, col, descricoes_unicas[inicio:inicio + tamanho_bloco], medir): (col, inicio)
+            for col in motores for inicio in inicios
+        }
+        try:
+            for concluidas, tarefa in enumerate(as_completed(tarefas), 1):
+                col, inicio = tarefas[tarefa]
+                parcial, estatisticas, falhas_bloco = tarefa.result()
+                if medir: instrumentacao.somar_estatisticas(col, estatisticas)
+                if falhas is not None: somar_falhas(falhas.setdefault(col, {}), falhas_bloco)
+                resultados[col][inicio:inicio + len(parcial)] = parcial
+                if ao_progredir: ao_progredir(concluidas / len(tarefas), col)
+        except BaseException:
+            pool.shutdown(cancel_futures=True)  # erro ou cancelamento (TarefaCancelada): descarta os blocos na fila
+            raise
+    return resultados
+
+def coluna_classificada(resultados, codigos, antes):
+    """Resultados por descrição distinta replicados às linhas como Categorical.
+
+    Equivale a novos.combine_first(antes): linhas sem resultado mantêm o valor anterior.
+    """
+    # O código -1 (descrição vazia) aponta para o None acrescentado ao final
+    codigos_resultados, categorias = pd.factorize(np.array(resultados + [None], dtype=object))
+    codigos_linhas = codigos_resultados[codigos]
+    sem_resultado = codigos_linhas == -1
+    if sem_resultado.any():
+        codigos_antes, categorias_antes = pd.factorize(antes[sem_resultado])
+        categorias = pd.Index(categorias, dtype=object)
+        categorias = categorias.append(pd.Index(categorias_antes, dtype=object).difference(categorias, sort=False))
+        posicoes = np.append(categorias.get_indexer(categorias_antes), -1)  # -1 continua vazio
+        codigos_linhas[sem_resultado] = posicoes[codigos_antes]
+    return pd.Categorical.from_codes(codigos_linhas, categories=pd.Index(categorias, dtype=object))
+
+def relatorio_mudancas_coluna(col_alvo, antes, depois, ids_sku, descricoes):
+    """Linhas do relatório de mudanças de uma coluna (texto diferente e valor novo preenchido), ou None."""
+    mudou = pd.notna(depois)
+    mudou[mudou] = _como_texto(antes[mudou]) != _como_texto(depois[mudou])
+    if not mudou.any(): return None
+    return pd.DataFrame({
+        'SKU ID': ids_sku[mudou],
+        'Descrição': descricoes[mudou],
+        'Coluna': col_alvo,
+        'Antes': antes[mudou],
+        'Depois': depois[mudou]
+    })
+
+def processar_dataframe_classificador(df_sku, regras_otimizadas, config_industria, n_processos=1, progresso=None,
+                                      instrumentacao=None, armazem=None, escopo='', copiar=True):
+    """Classifica df_sku nos atributos da indústria; devolve (DataFrame final, relatório de mudanças).
+
+    Com um armazem (ArmazemResultados), as descrições já classificadas com as mesmas regras no
+    mesmo escopo (ex.: "indústria/categoria") são reaproveitadas e só as novas passam pelas regex.
+    Se alguma busca de regra protegida ficou sem resposta (estouro de tempo ou quarentena), o
+    resultado está degradado: nada é gravado no armazem e df.attrs['buscas_sem_resposta'] traz o total.
+    As colunas de atributo saem categóricas. copiar=False dispensa a cópia integral de df_sku:
+    com o copy-on-write do pandas 3 o original continua intacto sem duplicar a memória.
+    """
+    progresso = progresso or _sem_progresso
+    colunas_alvo = config_industria['colunas']
+    comparativos = []
+
+    with medir_etapa(instrumentacao, "Preparação"):
+        df_processado = df_sku.copy(deep=copiar)
+        vazia = pd.Categorical.from_codes(np.full(len(df_processado), -1, dtype=np.int8), categories=[])
+        for col in colunas_alvo:
+            if col not in df_processado.columns: df_processado[col] = vazia
+
+        # Cada descrição distinta é classificada uma única vez e o resultado é replicado às linhas
+        codigos, descricoes_unicas = fatorar_textos(df_processado['Nome SKU'])
+        descricoes = df_processado['Nome SKU'].to_numpy(dtype=object)
+        if SKU_PADRAO_FINAL in df_processado.columns: ids_sku = df_processado[SKU_PADRAO_FINAL].to_numpy(dtype=object)
+        else: ids_sku = np.arange(len(df_processado))
+
+    with medir_etapa(instrumentacao, "Índice de regras"):
+        motores = {col: compilar_motor_regras(regras_otimizadas[col]) for col in colunas_alvo if col in regras_otimizadas}
+
+    # Só as descrições sem resultado armazenado (pendentes) passam pelas regras
+    armazenados, pendentes = {}, descricoes_unicas
+    if armazem is not None and motores:
+        with medir_etapa(instrumentacao, "Consulta aos resultados armazenados"):
+            versao = versao_regras(motores)
+            armazenados = armazem.consultar(versao, escopo, descricoes_unicas)
+            if armazenados: pendentes = [d for d in descricoes_unicas if d not in armazenados]
+    novos, falhas = {}, {}
+
+    if n_processos > 1 and motores and pendentes:
+        progresso(0, f"Classificando {len(motores)} atributos em {n_processos} processos...")
+        with medir_etapa(instrumentacao, "Classificação paralela"):
+            novos = classificar_em_paralelo(
+                motores, pendentes, n_processos,
+                ao_progredir=lambda fracao, col: progresso(fracao), instrumentacao=instrumentacao, falhas=falhas
+            )
+    elif motores:
+        novos = classificar_com_indice(
+            motores, pendentes, ao_progredir=lambda fracao, col: progresso(fracao, f"Classificando: {col}..."),
+            instrumentacao=instrumentacao, falhas=falhas
+        )
+    sem_resposta = sum(e + i for por_regra in falhas.values() for e, i in por_regra.values())
+    if instrumentacao is not None:
+        for col, por_regra in falhas.items(): instrumentacao.somar_falhas(col, por_regra)
+            
+    for col_alvo in colunas_alvo:
+        if col_alvo in motores:
+            resultados = novos[col_alvo]
+            if armazenados:
+                posicao = list(motores).index(col_alvo)
+                calculados = iter(resultados)
+                resultados = [armazenados[d][posicao] if d in armazenados else next(calculados) for d in descricoes_unicas]
+            with medir_etapa(instrumentacao, "Aplicação dos resultados", col_alvo):
+                antes = df_processado[col_alvo].to_numpy(dtype=object)
+                df_processado[col_alvo] = coluna_classificada(resultados, codigos, antes)
+
+            with medir_etapa(instrumentacao, "Relatório de mudanças", col_alvo):
+                mudancas = relatorio_mudancas_coluna(
+                    col_alvo, antes, df_processado[col_alvo].to_numpy(dtype=object), ids_sku, descricoes
+                )
+            if mudancas is not None: comparativos.append(mudancas)
+    if armazem is not None and motores and pendentes and not sem_resposta:
+        with medir_etapa(instrumentacao, "Gravação dos resultados"):
+            armazem.gravar(versao, escopo, pendentes, zip(*(novos[col] for col in motores)))
+    with medir_etapa(instrumentacao, "Consolidação do relatório"):
+        df_comp = pd.concat(comparativos, ignore_index=True).infer_objects() if comparativos else pd.DataFrame()
+    if sem_resposta: df_processado.attrs['buscas_sem_resposta'] = sem_resposta
+    return df_processado, df_comp
+
+def _preparar_arquivo_extrator(df_raw, config_industria):
+    """Limpa um arquivo lido: devolve (colunas-alvo com SKU corrigido, diagnóstico de colunas faltantes ou None)."""
+    if df_raw is None: raise ValueError("Arquivo ilegível ou formato inválido.")
+    sku_input = config_industria["sku_origem"]
+    # Garante que o Nome SKU esteja no mestre
+    colunas_alvo = [SKU_PADRAO_FINAL, COL_NOME_SKU] + config_industria["colunas_atributos"]
+    # Lido com poda de colunas: o diagnóstico usa o cabeçalho completo registrado na leitura
+    cabecalho = df_raw.attrs.get('colunas_arquivo')
+    df_raw = clean_column_names(df_raw)
+
+    if sku_input not in df_raw.columns:
+        raise ValueError(f"Coluna chave '{sku_input}' não encontrada.")
+
+    df_raw = df_raw.rename(columns={sku_input: SKU_PADRAO_FINAL})
+    skus_corrigidos = limpar_sku_cientifico(df_raw[SKU_PADRAO_FINAL])
+    df_raw[SKU_PADRAO_FINAL] = skus_corrigidos
+    df_raw = df_raw.dropna(subset=[SKU_PADRAO_FINAL])
+
+    colunas_existentes = [c for c in colunas_alvo if c in df_raw.columns]
+    colunas_faltantes = [c for c in colunas_alvo if c not in df_raw.columns]
+    if cabecalho is None: encontradas = list(df_raw.columns)
+    else: encontradas = [SKU_PADRAO_FINAL if c == sku_input else c for c in map(normalizar_nome_coluna, cabecalho)]
+    diagnostico = {"Faltaram": colunas_faltantes, "Encontradas": encontradas} if colunas_faltantes else None
+
+    # Sem .copy(): com copy-on-write a seleção já é independente de df_raw
+    df_selecionado = df_raw[colunas_existentes]
+    for col in colunas_faltantes: df_selecionado[col] = pd.NA
+    return df_selecionado[colunas_alvo], diagnostico
+
+def colunas_extrator(config_industria):
+    """Colunas (nomes normalizados) que o extrator aproveita de cada arquivo."""
+    return {config_industria["sku_origem"], COL_NOME_SKU, *config_industria["colunas_atributos"]}
+
+def arquivo_em_memoria(nome, dados):
+    """Reconstrói um upload a partir do nome e dos bytes (objetos de upload não são serializáveis)."""
+    arquivo = io.BytesIO(dados)
+    arquivo.name = nome
+    return arquivo
+
+def _ler_e_preparar_arquivo(nome, dados, config_industria):
+    """Tarefa do pool: recebe o nome e os bytes do upload."""
+    arquivo = arquivo_em_memoria(nome, dados)
+    return _preparar_arquivo_extrator(ler_arquivo_robusto(arquivo, colunas_extrator(config_industria)), config_industria)
+
+def processar_arquivos_extrator(files, config_industria, progresso=None, leitor=ler_arquivo_robusto, n_processos=1,
+                                instrumentacao=None):
+    """Consolida os arquivos no mestre. Com n_processos > 1, a leitura e a limpeza de cada
+    arquivo rodam em um pool de processos (leitor(arquivo, colunas) é usado apenas no modo sequencial)."""
+    progresso = progresso or _sem_progresso
+    lista_dfs = []
+    log_erros = []
+    debug_missing_cols = {} 
+    cols_atributos = config_industria["colunas_atributos"]
+
+    # Um resultado (ou a exceção) por arquivo, na ordem de envio
+    resultados = [None] * len(files)
+    if n_processos > 1 and len(files) > 1:
+        contexto = multiprocessing.get_context('spawn')
+        with medir_etapa(instrumentacao, "Leitura paralela"), \
+                ProcessPoolExecutor(max_workers=min(n_processos, len(files)), mp_context=contexto) as pool:
+            tarefas = {
+                pool.submit(_ler_e_preparar_arquivo, file.name, _conteudo_arquivo(file), config_industria): i
+                for i, file in enumerate(files)
+            }
+            try:
+                for n, tarefa in enumerate(as_completed(tarefas), 1):
+                    try: resultados[tarefas[tarefa]] = tarefa.result()
+                    except Exception as e: resultados[tarefas[tarefa]] = e
+                    progresso(n / len(files))
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+    else:
+        for i, file in enumerate(files):
+            with medir_etapa(instrumentacao, "Leitura", file.name):
+                try: resultados[i] = _preparar_arquivo_extrator(leitor(file, colunas_extrator(config_industria)), config_industria)
+                except Exception as e: resultados[i] = e
+            progresso((i + 1) / len(files))
+
+    for file, resultado in zip(files, resultados):
+        if isinstance(resultado, Exception):
+            log_erros.append(f"❌ ERRO no arquivo **{file.name}**: {str(resultado)}")
+            continue
+        df_selecionado, diagnostico = resultado
+        if diagnostico: debug_missing_cols[file.name] = diagnostico
+        lista_dfs.append(df_selecionado)
+
+    if log_erros: return None, log_erros, debug_missing_cols
+    if not lista_dfs: return None, ["Nenhum dado válido extraído."], debug_missing_cols
+
+    with medir_etapa(instrumentacao, "Consolidação"):
+        # Cada arquivo já chega sem SKU vazio (_preparar_arquivo_extrator); os blocos lidos são
+        # liberados logo após a concatenação e as duplicatas só geram um novo frame se existirem
+        df_consolidado = pd.concat(lista_dfs, ignore_index=True)
+        lista_dfs.clear()
+        resultados.clear()
+        manter, conflito = agrupar_linhas_extrator(df_consolidado)
+        if not manter.all(): df_consolidado, conflito = df_consolidado[manter], conflito[manter]
+    
+    # Sanitização (Maiúsculo, Sem Acentos, Sem Pontos); os atributos, de poucos valores distintos, viram categóricos
+    cols_para_tratar = cols_atributos + [COL_NOME_SKU]
+    for col in cols_para_tratar:
+        if col in df_consolidado.columns:
+            with medir_etapa(instrumentacao, "Normalização", col):
+                df_consolidado[col] = padronizar_serie_extrator(df_consolidado[col], categorica=col != COL_NOME_SKU)
+
+    # Conflitos já marcados na consolidação (antes da normalização, como as duplicatas); o relatório sai normalizado
+    skus_conflitantes = df_consolidado[conflito]
+    return df_consolidado, skus_conflitantes, debug_missing_cols
+
+def agrupar_linhas_extrator(df):
+    """Uma passada de fatoração por coluna marca as linhas a manter (primeira de cada linha repetida)
+    e as linhas cujo SKU aparece com conteúdos diferentes.
+
+    Equivale a ~df.duplicated() seguido de duplicated(subset=SKU, keep=False) no resultado, mas o
+    SKU é fatorado uma única vez e os conflitos saem de uma contagem por código (np.bincount).
+    """
+    codigos_sku, skus = pd.factorize(df[SKU_PADRAO_FINAL], use_na_sentinel=False)
+    ids_linha, total = codigos_sku.astype(np.int64), len(skus)
+    for col in df.columns.drop(SKU_PADRAO_FINAL):
+        codigos, unicos = pd.factorize(df[col], use_na_sentinel=False)
+        if total * len(unicos) >= 2 ** 62:  # recomprime os ids antes de estourar o int64
+            ids_linha, vistos = pd.factorize(ids_linha)
+            total = len(vistos)
+        ids_linha = ids_linha * len(unicos) + codigos
+        total *= len(unicos)
+    manter = ~pd.Series(ids_linha).duplicated().to_numpy()
+    conflito = np.bincount(codigos_sku[manter], minlength=len(skus))[codigos_sku] > 1
+    return manter, conflito & manter
+
+def fragmentar_por_atributo(df_mestre, config_industria, tamanho_parte=None):
+    """Gera uma planilha (SKU + atributo) por atributo, em partes de até tamanho_parte linhas.
+
+    Sem tamanho_parte, vale o "tamanho_fragmento" da indústria (ou TAMANHO_FRAGMENTO_PADRAO).
+    """
+    tamanho_parte = tamanho_parte or config_industria.get("tamanho_fragmento", TAMANHO_FRAGMENTO_PADRAO)
+    arquivos = {}
+    relatorio_skip = []
+    for col in config_industria["colunas_atributos"]:
+        if col in df_mestre.columns:
+            cols_fragmento = [SKU_PADRAO_FINAL, col] # APENAS SKU E O ATRIBUTO
+            cols_fragmento = [c for c in cols_fragmento if c in df_mestre.columns]
+            
+            sub_df = df_mestre[cols_fragmento].dropna(subset=[col])
+            if not sub_df.empty:
+                sub_df = sub_df[sub_df[col].astype(str).str.strip() != ""]
+            
+            if not sub_df.empty:
+                total_sub = len(sub_df)
+                nome_base = f"Planilha_{col.replace(' ', '_')}"
+                if total_sub > tamanho_parte:
+                    num_partes = int(np.ceil(total_sub / tamanho_parte))
+                    partes = np.array_split(sub_df, num_partes)
+                    for idx, parte in enumerate(partes):
+                        arquivos[f"{nome_base}_Parte_{idx+1}.xlsx"] = parte
+                else:
+                    arquivos[f"{nome_base}.xlsx"] = sub_df
+            else:
+                relatorio_skip.append(f"⚠️ {col}: Vazia (Ignorada).")
+        else:
+            relatorio_skip.append(f"❌ {col}: Não encontrada.")
+    return arquivos, relatorio_skip
+
+# ==============================================================================
+# FILA DE TAREFAS EM SEGUNDO PLANO
+# ==============================================================================
+# Classificações e extrações rodam fora do script do Streamlit, em um pool de threads do
+# servidor (cada tarefa pode usar, por sua vez, o pool de processos). Estado e resultado são
+# gravados em PASTA_CACHE/tarefas/<id>/, de modo que uma sessão nova (refresh, reconexão)
+# reencontra a tarefa pelo id e recarrega o resultado.
+ESTADOS_FINAIS = ('concluída', 'falhou', 'cancelada', 'interrompida')
+
+class TarefaCancelada(Exception):
+    """Levantada pelo callback de progresso quando o cancelamento da tarefa foi pedido."""
+
+class FilaTarefas:
+    """Executa funcao(*args, progresso=callback) em segundo plano e persiste o dict que ela devolve.
+
+    Um dict com 'reaproveitavel': False (ex.: resultado degradado) não é oferecido a envios com a mesma chave.
+    """
+
+    def __init__(self, pasta, max_simultaneas=2, validade_horas=24):
+        self.pasta = pasta
+        self.validade_s = validade_horas * 3600
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix="tarefa")
+        self._tarefas = {}   # id -> estado (apenas as tarefas deste processo)
+        self._cancelar = {}  # id -> threading.Event
+        self._por_chave = {}  # chave da entrada -> id, para reaproveitar tarefas idênticas
+        self._lock = threading.Lock()
+
+    def _caminho(self, id_tarefa, nome):
+        return os.path.join(self.pasta, id_tarefa, nome)
+
+    def _gravar_estado(self, estado):
+        caminho = self._caminho(estado['id'], "estado.pkl")
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho + ".tmp", "wb") as f: pickle.dump(estado, f)
+        os.replace(caminho + ".tmp", caminho)
+
+    def _atualizar(self, id_tarefa, persistir=False, **campos):
+        with self._lock:
+            estado = self._tarefas[id_tarefa]
+            estado.update(campos)
+            copia = dict(estado)
+        if persistir: self._gravar_estado(copia)
+
+    def enviar(self, tipo, funcao, *args, chave=None):
+        """Agenda a tarefa e devolve o seu id.
+
+        Com chave (ex.: hash do arquivo e das opções), uma tarefa concluída com a mesma chave é
+        reaproveitada: quem envia o mesmo arquivo recebe o mesmo id e o mesmo resultado. Tarefas
+        ainda na fila ou executando não são compartilhadas, pois o cancelamento de uma sessão
+        interromperia a tarefa da outra.
+        """
+        self.podar()
+        if chave is not None:
+            with self._lock: anterior = self._por_chave.get(chave)
+            estado = self.estado(anterior) if anterior else None
+            if estado is not None and estado['estado'] == 'concluída': return anterior
+        id_tarefa = uuid.uuid4().hex
+        estado = {'id': id_tarefa, 'tipo': tipo, 'estado': 'na fila', 'progresso': 0.0, 'mensagem': None,
+                  'erro': None, 'criada_em': time.time(), 'concluida_em': None}
+        with self._lock:
+            self._tarefas[id_tarefa] = estado
+            self._cancelar[id_tarefa] = threading.Event()
+            if chave is not None: self._por_chave[chave] = id_tarefa
+        self._gravar_estado(dict(estado))
+        self._executor.submit(self._executar, id_tarefa, funcao, args)
+        return id_tarefa
+
+    def _executar(self, id_tarefa, funcao, args):
+        cancelar = self._cancelar[id_tarefa]
+
+        def progresso(fracao, mensagem=None):
+            if cancelar.is_set(): raise TarefaCancelada()
+            campos = {'progresso': fracao}
+            if mensagem is not None: campos['mensagem'] = mensagem
+            self._atualizar(id_tarefa, **campos)
+
+        try:
+            if cancelar.is_set(): raise TarefaCancelada()
+            self._atualizar(id_tarefa, persistir=True, estado='executando')
+            resultado = funcao(*args, progresso=progresso)
+            if cancelar.is_set(): raise TarefaCancelada()
+            if not resultado.pop('reaproveitavel', True): self.esquecer(id_tarefa)
+            caminho = self._caminho(id_tarefa, "resultado.pkl")
+            with open(caminho + ".tmp", "wb") as f: pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(caminho + ".tmp", caminho)
+            self._atualizar(id_tarefa, persistir=True, estado='concluída', progresso=1.0, concluida_em=time.time())
+        except TarefaCancelada:
+            self._atualizar(id_tarefa, persistir=True, estado='cancelada', concluida_em=time.time())
+        except Exception as e:
+            self._atualizar(id_tarefa, persistir=True, estado='falhou', erro=str(e), concluida_em=time.time())
+        finally:
+            with self._lock: self._cancelar.pop(id_tarefa, None)
+
+    def estado(self, id_tarefa):
+        """Cópia do estado da tarefa, com a posição na fila; None se o id é desconhecido ou expirou.
+
+        Tarefas de um processo anterior do servidor que não chegaram ao fim aparecem como 'interrompida'.
+        """
+        if not re.fullmatch(r'[0-9a-f]{32}', id_tarefa or ''): return None  # o id pode vir da URL
+        with self._lock:
+            if id_tarefa in self._tarefas:
+                estado = dict(self._tarefas[id_tarefa])
+                if estado['estado'] == 'na fila':
+                    estado['posicao'] = 1 + sum(1 for t in self._tarefas.values()
+                                                if t['estado'] == 'na fila' and t['criada_em'] < estado['criada_em'])
+                return estado
+        try:
+            with open(self._caminho(id_tarefa, "estado.pkl"), "rb") as f: estado = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if estado['estado'] not in ESTADOS_FINAIS: estado['estado'] = 'interrompida'
+        return estado
+
+    def cancelar(self, id_tarefa):
+        """Pede o cancelamento; a tarefa para no próximo aviso de progresso. Devolve False se ela já terminou."""
+        with self._lock: evento = self._cancelar.get(id_tarefa)
+        if evento is None: return False
+        evento.set()
+        return True
+
+    def esquecer(self, id_tarefa):
+        """Deixa de oferecer a tarefa para reaproveitamento (ex.: o resultado dela expirou)."""
+        with self._lock:
+            for chave in [c for c, i in self._por_chave.items() if i == id_tarefa]: del self._por_chave[chave]
+
+    def resultado(self, id_tarefa):
+        with open(self._caminho(id_tarefa, "resultado.pkl"), "rb") as f: return pickle.load(f)
+
+    def podar(self):
+        """Apaga as tarefas encerradas há mais de validade_horas."""
+        if not os.path.isdir(self.pasta): return
+        limite = time.time() - self.validade_s
+        for id_tarefa in os.listdir(self.pasta):
+            with self._lock:
+                if id_tarefa in self._cancelar: continue  # ainda em andamento
+            try:
+                if os.path.getmtime(os.path.join(self.pasta, id_tarefa)) >= limite: continue
+                shutil.rmtree(os.path.join(self.pasta, id_tarefa))
+            except OSError:
+                continue
+            self.esquecer(id_tarefa)
+            with self._lock: self._tarefas.pop(id_tarefa, None)
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+import cli
+import motor
+
+
+def test_arquivo_acima_do_limite_do_excel_nao_interrompe_o_lote(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(motor, 'CACHE_DISCO', motor.CacheDisco(str(tmp_path / 'cache')))
+    monkeypatch.setattr(motor, 'LIMITE_LINHAS_EXCEL', 4)
+    entradas = tmp_path / 'entradas'
+    entradas.mkdir()
+    pd.DataFrame({'Nome SKU': ['WAFER', 'COOKIE', 'WAFER', 'ROSCA']}).to_csv(entradas / 'a_grande.csv', index=False)
+    pd.DataFrame({'Nome SKU': ['WAFER', 'COOKIE']}).to_csv(entradas / 'b_pequena.csv', index=False)
+    saida = tmp_path / 'saida'
+    saida.mkdir()
+
+    codigo = cli.main(['classificar', '--industria', 'M.DIAS BRANCO', '--categoria', 'Biscoitos', '--completo',
+                       '--saida', str(saida), str(entradas)])
+
+    assert codigo == 1
+    assert '--formato csv' in capsys.readouterr().out
+    gerados = os.listdir(saida)
+    assert not any('a_grande' in nome for nome in gerados)
+    assert any(nome.startswith('Classificados_') and 'b_pequena' in nome for nome in gerados)
+
+
+def test_cli_nao_importa_streamlit():
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codigo = "import sys, cli, motor, benchmark; sys.exit('streamlit' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', codigo], cwd=raiz).returncode == 0
+
+
+def test_limpar_cache_apaga_dicionarios_compilados(tmp_path, monkeypatch):
+    cache = motor.CacheDisco(str(tmp_path / 'cache'))
+    armazem = motor.ArmazemResultados(str(tmp_path / 'resultados.sqlite3'))
+    monkeypatch.setattr(motor, 'CACHE_DISCO', cache)
+    monkeypatch.setattr(motor, 'ARMAZEM_RESULTADOS', armazem)
+    cache.obter('a', lambda: 1)
+    cache.obter('b', lambda: 2)
+    armazem.gravar('v1', 'escopo', ['WAFER'], [('WAFER',)])
+
+    assert cli.main(['limpar-cache', '--dicionarios']) == 0
+    assert os.listdir(cache.pasta) == []
+    assert cache.obter('a', lambda: 3) == 3
+    assert armazem.consultar('v1', 'escopo', ['WAFER']) == {'WAFER': ('WAFER',)}
+
+    assert cli.main(['limpar-cache']) == 0
+    assert not any(nome.startswith('resultados.sqlite3') for nome in os.listdir(tmp_path))
+    assert armazem.consultar('v1', 'escopo', ['WAFER']) == {}
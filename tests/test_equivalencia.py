@@ -0,0 +1,141 @@
+"""Os motores otimizados devem dar o mesmo resultado das implementações originais (laço simples)."""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import motor
+
+REGRAS = [
+    # Tipo de Regra, Valor da Regra, Interpretação, Grau de Associação
+    ('Familia', 'WAFER|WAFFER', 'WAFER 1', 120),
+    ('Familia', 'WAF', 'WAFER 2', 120),           # empate: vale a que vem antes no dicionário
+    ('Familia', 'RECHEAD', 'RECHEADOS', 130),
+    ('Familia', 'BISCOITO', 'BISCOITOS', 90),
+    ('Familia', r'PÃO\s*DE\s*MEL', 'PÃO DE MEL', 115),
+    ('Familia', r'CREAM\s*CRACKER|C\.CRACKER', 'CRACKER', 110),
+    ('Familia', r'\d{3}', 'NUMERO', 50),          # sem literal
+    ('Familia', r'^.{0,3}$', 'CURTO', 60),         # sem literal
+    ('Familia', 'SNACK', 'SNACKS', 100),
+    ('Familia', 'ÇÚ', 'ACUCAR', 100),
+    ('Familia', '[', 'INVALIDA', 200),            # não compila: ignorada
+    ('Familia', 'KIT', 'NEGATIVA', -5),           # score negativo nunca vence
+    ('Familia', 'OK', 'SEM SCORE', None),         # score vazio vale 0
+    ('Familia', '.*', 'OUTROS', 1),
+    ('Familia', 'WAFER', 'WAFER 3', 120),
+    ('Marca', 'x', 'X 1', 10),
+    ('Marca', 'X', 'X 2', 10),
+    ('Marca', 'CHOC|MORANGO', 'SABOR', 5),
+    ('Marca', r'(CREAM|AGUA)\s+\w+', 'TIPO', 20),
+]
+
+DESCRICOES = [
+    'WAFER CHOC 140G', 'Waffer morango', 'biscoito wafér', 'BİSCOITO RECHEADO', 'ſnack de milho',
+    'PÃO DE MEL 200g', 'pao de mel', '123', 'AB1 x', '', '   ', 'CREAM CRACKER 400G', 'cream  cracker',
+    'C.CRACKER', 'CXCRACKER', 'açúcar', 'AÇÚCAR', 'KİT', 'ok', 'abcdef', 'AGUA e sal', 'Ｗａｆｅｒ',
+]
+
+
+def _dicionario(regras=REGRAS):
+    return pd.DataFrame(regras, columns=['Tipo de Regra', 'Valor da Regra', 'Interpretação', 'Grau de Associação'])
+
+
+def _classificar_ingenuo(df_dict, descricoes):
+    """Motor original: todas as regras em cada descrição, vence o maior score (o primeiro, no empate)."""
+    por_coluna = {}
+    for tipo, padrao, valor, score in zip(*(df_dict[c] for c in motor.COLUNAS_REGRAS)):
+        try: compilada = re.compile(str(padrao), re.IGNORECASE)
+        except re.error: continue
+        por_coluna.setdefault(str(tipo).strip(), []).append((compilada, valor, int(score) if pd.notna(score) else 0))
+    resultados = {}
+    for coluna, regras in por_coluna.items():
+        resultados[coluna] = []
+        for descricao in descricoes:
+            melhor, maior_score = None, -1
+            for compilada, valor, score in regras:
+                if compilada.search(descricao) and score > maior_score: melhor, maior_score = valor, score
+            resultados[coluna].append(melhor)
+    return resultados
+
+
+def _sem_nan(valores):
+    return [None if v is None or (isinstance(v, float) and np.isnan(v)) else v for v in valores]
+
+
+@pytest.mark.parametrize('descricoes', [DESCRICOES, DESCRICOES[::-1]])
+def test_classificar_por_indice_igual_ao_laco(descricoes):
+    df_dict = _dicionario()
+    esperado = _classificar_ingenuo(df_dict, descricoes)
+    regras = motor._compilar_regras(df_dict)
+    assert set(regras) == set(esperado)
+    for coluna, lista in regras.items():
+        motor_coluna = motor.compilar_motor_regras(lista)
+        indice = motor.IndiceInvertido(descricoes, motor_coluna['literais_indice'])
+        assert motor.classificar_por_indice(motor_coluna, indice) == esperado[coluna], coluna
+
+
+def test_classificar_com_indice_em_blocos():
+    df_dict = _dicionario()
+    motores = {col: motor.compilar_motor_regras(lista) for col, lista in motor._compilar_regras(df_dict).items()}
+    resultados = motor.classificar_com_indice(motores, DESCRICOES, tamanho_bloco=5)
+    assert resultados == _classificar_ingenuo(df_dict, DESCRICOES)
+
+
+def test_processar_dataframe_igual_ao_laco():
+    df_dict = _dicionario()
+    df_sku = pd.DataFrame({
+        'Nome SKU': DESCRICOES + [None, 'WAFER CHOC 140G'],
+        'Familia': ['ANTIGO'] * (len(DESCRICOES) + 2),
+    })
+    df_final, df_comp = motor.processar_dataframe_classificador(df_sku, motor._compilar_regras(df_dict),
+                                                                {'colunas': ['Familia', 'Marca']})
+    textos = df_sku['Nome SKU'].fillna('').astype(str).tolist()
+    esperado = _classificar_ingenuo(df_dict, textos)
+    # Sem resultado (ou sem descrição), a linha mantém o valor anterior (combine_first)
+    familia = [novo if novo is not None and pd.notna(d) else 'ANTIGO'
+               for novo, d in zip(esperado['Familia'], df_sku['Nome SKU'])]
+    marca = [novo if pd.notna(d) else None for novo, d in zip(esperado['Marca'], df_sku['Nome SKU'])]
+    assert _sem_nan(df_final['Familia'].tolist()) == familia
+    assert _sem_nan(df_final['Marca'].tolist()) == marca
+    assert len(df_comp) == sum(f != 'ANTIGO' for f in familia) + sum(m is not None for m in marca)
+
+
+def test_dicionario_real_igual_ao_laco():
+    caminho = os.path.join(config.PASTA_DICIONARIOS, 'dicionario_mdias_biscoitos.xlsx')
+    df_dict = motor._validar_dicionario(pd.read_excel(caminho, usecols=motor.COLUNAS_REGRAS))
+    # Descrições montadas com as interpretações do próprio dicionário, em caixas e acentuações variadas
+    interpretacoes = df_dict['Interpretação'].dropna().astype(str).unique()
+    gerador = np.random.default_rng(0)
+    descricoes = []
+    for _ in range(150):
+        partes = gerador.choice(interpretacoes, size=3)
+        texto = ' '.join(partes) + f" {gerador.integers(10, 1000)}G"
+        descricoes.append(texto.lower() if gerador.random() < 0.3 else texto)
+    descricoes += ['PAO DE MEL', 'pão  de mel', 'WAFFER', 'C.CRACKER 400G', 'Ｃｏｏｋｉｅ', '']
+    esperado = _classificar_ingenuo(df_dict, descricoes)
+    motores = {col: motor.compilar_motor_regras(lista) for col, lista in motor._compilar_regras(df_dict).items()}
+    assert motor.classificar_com_indice(motores, descricoes, tamanho_bloco=64) == {c: esperado[c] for c in motores}
+
+
+VALORES_EXTRATOR = [
+    'Biscoito Recheado 1.5kg', ' pão de mel. ', 'AÇÚCAR', 'ﬁno', 'straße', 'café ☕', 'Ｗａｆｅｒ', 'x.y.z',
+    None, np.nan, '', '   ', 'ÁGUA', 'agua', 1, 1.0, 2.5, 'São José', 'İstanbul', 'ǅ',
+]
+
+
+@pytest.mark.parametrize('serie', [
+    pd.Series(VALORES_EXTRATOR, dtype=object, name='Marca'),
+    pd.Series([v for v in VALORES_EXTRATOR if isinstance(v, str)] + [None], dtype='string', name='Marca'),
+    pd.Series([1.5, np.nan, 2.0, 1.5], name='Gramatura'),
+    pd.Series([None, np.nan], dtype=object, name='Vazia'),
+])
+def test_padronizar_serie_igual_ao_texto(serie):
+    esperado = serie.apply(motor.padronizar_texto_extrator)
+    pd.testing.assert_series_equal(motor.padronizar_serie_extrator(serie), esperado)
+
+    categorica = motor.padronizar_serie_extrator(serie, categorica=True)
+    assert isinstance(categorica.dtype, pd.CategoricalDtype)
+    assert _sem_nan(categorica.astype(object).tolist()) == _sem_nan([None if pd.isna(v) else v for v in esperado])
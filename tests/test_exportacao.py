@@ -0,0 +1,28 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import motor
+
+
+def test_excel_infinito_igual_ao_pandas():
+    df = pd.DataFrame({
+        'a': [1.0, np.inf, -np.inf, np.nan],
+        'b': np.array([np.inf, 1, -np.inf, np.nan], dtype=np.float32),
+        'c': pd.array([np.inf, None, -np.inf, 2.5], dtype=object),
+    })
+    esperado = io.BytesIO()
+    df.to_excel(esperado, index=False, engine='xlsxwriter')
+
+    lido = pd.read_excel(io.BytesIO(motor.to_excel_bytes(df)))
+    pd.testing.assert_frame_equal(lido, pd.read_excel(esperado))
+    assert lido['a'].tolist()[1:3] == [np.inf, -np.inf]
+
+
+def test_excel_vazios_e_textos():
+    df = pd.DataFrame({'Nome SKU': ['WAFER', None, 'SUCO'], 'Gramatura': [pd.NA, 200, 1000]})
+    lido = pd.read_excel(io.BytesIO(motor.to_excel_bytes(df, tamanho_bloco=2)))
+    assert lido['Nome SKU'].tolist()[::2] == ['WAFER', 'SUCO']
+    assert lido['Nome SKU'].isna().tolist() == [False, True, False]
+    assert lido['Gramatura'].tolist()[1:] == [200, 1000]
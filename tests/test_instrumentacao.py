@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+import motor
+
+pytestmark = pytest.mark.skipif(motor.memoria_atual_mb() is None, reason="memória residente não legível nesta plataforma")
+
+
+def test_memoria_medida_por_etapa_e_nao_pelo_processo():
+    instrumentacao = motor.Instrumentacao()
+    with instrumentacao.etapa("Alocação"):
+        bloco = np.ones(25_000_000)  # ~190 MB
+        bloco.sum()
+    del bloco
+    with instrumentacao.etapa("Leve"):
+        pass
+    etapas = instrumentacao.tabela_etapas().set_index('Etapa')
+    assert etapas.loc['Alocação', 'Acréscimo de Memória (MB)'] > 100
+    # O pico da etapa anterior não contamina as seguintes (ru_maxrss só cresce)
+    assert etapas.loc['Leve', 'Acréscimo de Memória (MB)'] < 50
+    assert etapas.loc['Leve', 'Pico de Memória (MB)'] < etapas.loc['Alocação', 'Pico de Memória (MB)']
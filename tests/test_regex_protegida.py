@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import motor
+
+pytest.importorskip('regex')
+
+REGRAS = pd.DataFrame({
+    'Tipo de Regra': ['Marca', 'Marca'],
+    'Valor da Regra': [r'^(\w+\s?)+$', 'ZZ'],
+    'Interpretação': ['LENTA', 'ZZ'],
+    'Grau de Associação': [5, 1],
+})
+DESCRICOES = ['a' * 30 + ' b' * 10 + f'!{i}' for i in range(6)] + ['ZZ top!']
+
+
+def _regras_com_limite_minimo():
+    regras = motor._compilar_regras(REGRAS, orcamento_ms=50)
+    protegida = regras['Marca'][0]['pattern']
+    assert isinstance(protegida, motor.RegexProtegida)
+    protegida.orcamento_s = 1e-6  # toda busca estoura
+    return regras
+
+
+def test_disjuntor_vale_por_execucao(tmp_path):
+    regras = _regras_com_limite_minimo()
+    armazem = motor.ArmazemResultados(str(tmp_path / 'resultados.sqlite3'))
+    for _ in range(2):  # a quarentena de uma execução não passa para a seguinte
+        instrumentacao = motor.Instrumentacao()
+        df_final, _ = motor.processar_dataframe_classificador(
+            pd.DataFrame({'Nome SKU': DESCRICOES}), regras, {'colunas': ['Marca']},
+            instrumentacao=instrumentacao, armazem=armazem
+        )
+        assert df_final['Marca'].tolist()[-1] == 'ZZ'
+        assert df_final.attrs['buscas_sem_resposta'] == len(DESCRICOES)
+        lenta = instrumentacao.tabela_regras().set_index('Padrão').loc[REGRAS['Valor da Regra'][0]]
+        assert (lenta['Estouros de Tempo'], lenta['Ignoradas (Quarentena)']) == (3, len(DESCRICOES) - 3)
+    # Resultado degradado não é gravado para reaproveitamento
+    assert armazem.consultar(motor.versao_regras({'Marca': motor.compilar_motor_regras(regras['Marca'])}), '', DESCRICOES) == {}
+
+
+def test_disjuntor_atravessa_blocos_da_execucao():
+    regras = _regras_com_limite_minimo()
+    motores = {'Marca': motor.compilar_motor_regras(regras['Marca'])}
+    falhas = {}
+    motor.classificar_com_indice(motores, DESCRICOES, tamanho_bloco=2, falhas=falhas)
+    assert falhas['Marca'][0] == [3, len(DESCRICOES) - 3]
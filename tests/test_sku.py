@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import motor
+
+
+def test_notacao_cientifica_com_virgula_e_ponto():
+    serie = pd.Series(['7,89123E+12', '7.89123E+12', '7,89123e12', ' 7891230000000 ', '07891230000000'])
+    assert motor.limpar_sku_cientifico(serie).tolist() == ['7891230000000'] * 5
+
+
+def test_decimais_sao_truncados_e_textos_invalidos_viram_na():
+    serie = pd.Series(['123,9', '-45.5', ',5', 'ABC', '1,234,567', '', None], index=range(10, 17))
+    resultado = motor.limpar_sku_cientifico(serie)
+    assert resultado.index.tolist() == list(range(10, 17))
+    assert resultado.tolist()[:3] == ['123', '-45', '0']
+    assert resultado.iloc[3:].isna().all()
+
+
+def test_numeros_nao_perdem_digitos():
+    assert motor.limpar_sku_cientifico(pd.Series(['12345678901234567890'])).tolist() == ['12345678901234567890']
+    inteiros = pd.Series([7891230000000, 17891230000005], dtype='Int64')
+    assert motor.limpar_sku_cientifico(inteiros).tolist() == ['7891230000000', '17891230000005']
+    flutuantes = pd.Series([7.89123e12, np.nan, np.inf])
+    assert motor.limpar_sku_cientifico(flutuantes).tolist()[0] == '7891230000000'
+    assert motor.limpar_sku_cientifico(flutuantes).iloc[1:].isna().all()
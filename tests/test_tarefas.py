@@ -0,0 +1,71 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import motor
+
+
+def _esperar(fila, id_tarefa, limite_s=10):
+    fim = time.time() + limite_s
+    while fila.estado(id_tarefa)['estado'] not in motor.ESTADOS_FINAIS:
+        assert time.time() < fim, "a tarefa não terminou"
+        time.sleep(0.01)
+    return fila.estado(id_tarefa)
+
+
+def _tarefa_bloqueada(liberar):
+    def tarefa(progresso=None):
+        while not liberar.wait(0.01): progresso(0.5)
+        return {'valor': 1}
+    return tarefa
+
+
+def test_tarefa_concluida_e_reaproveitada(tmp_path):
+    fila = motor.FilaTarefas(str(tmp_path))
+    primeira = fila.enviar('class', lambda progresso=None: {'valor': 1}, chave='k')
+    assert _esperar(fila, primeira)['estado'] == 'concluída'
+    assert fila.enviar('class', lambda progresso=None: {'valor': 2}, chave='k') == primeira
+    assert fila.resultado(primeira) == {'valor': 1}
+
+
+def test_tarefa_degradada_nao_e_reaproveitada(tmp_path):
+    fila = motor.FilaTarefas(str(tmp_path))
+    primeira = fila.enviar('class', lambda progresso=None: {'valor': 1, 'reaproveitavel': False}, chave='k')
+    _esperar(fila, primeira)
+    assert fila.resultado(primeira) == {'valor': 1}
+    assert fila.enviar('class', lambda progresso=None: {'valor': 2}, chave='k') != primeira
+
+
+def test_cancelar_nao_afeta_tarefa_de_outra_sessao(tmp_path):
+    fila = motor.FilaTarefas(str(tmp_path))
+    liberar = threading.Event()
+    try:
+        sessao_a = fila.enviar('class', _tarefa_bloqueada(liberar), chave='k')
+        sessao_b = fila.enviar('class', _tarefa_bloqueada(liberar), chave='k')
+        assert sessao_a != sessao_b
+        assert fila.cancelar(sessao_a)
+        assert _esperar(fila, sessao_a)['estado'] == 'cancelada'
+    finally:
+        liberar.set()
+    assert _esperar(fila, sessao_b)['estado'] == 'concluída'
+
+
+def test_reenviar_recarrega_resultado_reaproveitado(tmp_path, monkeypatch):
+    utils = pytest.importorskip('utils')  # depende do streamlit
+    fila = motor.FilaTarefas(str(tmp_path))
+    st = SimpleNamespace(session_state={}, query_params={}, warning=print, error=print, info=print)
+    monkeypatch.setattr(utils, 'st', st)
+    monkeypatch.setattr(utils, 'fila_tarefas', lambda: fila)
+
+    def tarefa(progresso=None):
+        return {'class_concluido': True, 'class_valor': 1}
+
+    for _ in range(2):
+        # Como o botão "Classificar": limpa o resultado anterior e envia a mesma entrada
+        st.session_state.update({'class_concluido': False, 'class_valor': None})
+        id_tarefa = utils.enviar_tarefa('class', tarefa, chave='k')
+        _esperar(fila, id_tarefa)
+        utils.acompanhar_tarefa('class')
+        assert st.session_state['class_concluido'] and st.session_state['class_valor'] == 1
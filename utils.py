@@ -1,212 +1,268 @@
+import streamlit as st
 import pandas as pd
-import re
-import io
 import os
-import numpy as np
-import unicodedata
-from datetime import datetime
-import streamlit as st
-from config import PASTA_DICIONARIOS, SKU_PADRAO_FINAL, COL_NOME_SKU
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import config
+import motor
 
 # ==============================================================================
-# FUNÇÕES DE CACHE E LÓGICA (BACKEND)
+# ADAPTADORES STREAMLIT
 # ==============================================================================
+# O processamento vive em motor.py (sem dependência de interface); aqui ficam a fila de
+# tarefas da sessão e a exibição de resultados usados por app.py.
 
-def get_data_atual_str():
-    return datetime.now().strftime("%d-%m-%Y")
+# --- TAREFAS EM SEGUNDO PLANO ---
+# Classificação e extração rodam na fila do servidor (motor.FilaTarefas). O id da tarefa fica na
+# sessão e na URL (?tarefa_<grupo>=id): após um refresh ou reconexão, a sessão nova reencontra a
+# tarefa e recarrega o resultado gravado em disco. As funções de tarefa rodam fora do script e
+# não podem chamar st.*; devolvem os valores de session_state do grupo, com cada DataFrame
+# trocado pelo id dele em motor.ARMAZEM_TABELAS (a sessão não guarda cópia dos resultados).
 
-def to_excel_bytes(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False)
-    return output.getvalue()
+@st.cache_resource(show_spinner=False)
+def fila_tarefas():
+    return motor.FilaTarefas(os.path.join(config.PASTA_CACHE, "tarefas"), config.MAX_TAREFAS_SIMULTANEAS,
+                             config.VALIDADE_TAREFAS_HORAS)
 
-def clean_column_names(df):
-    df.columns = df.columns.astype(str).str.strip().str.strip('.').str.replace(r'\s+', ' ', regex=True)
-    return df
+def tarefa_classificacao(nome_arquivo, dados, df_dict, config_industria, escopo, n_processos=1, medir=False, progresso=None):
+    instrumentacao = motor.Instrumentacao() if medir else None
+    with motor.medir_etapa(instrumentacao, "Leitura"):
+        df_sku = motor.ler_arquivo_cacheado(motor.arquivo_em_memoria(nome_arquivo, dados))
+    if df_sku is None: raise ValueError("Não foi possível ler a base de SKUs.")
+    df_sku.columns = df_sku.columns.str.strip()
+    if config.COL_NOME_SKU not in df_sku.columns:
+        raise ValueError(f"A planilha deve conter a coluna '{config.COL_NOME_SKU}'.")
+    with motor.medir_etapa(instrumentacao, "Regras do dicionário"):
+        regras = motor.otimizar_regras(df_dict)
+    if not regras: raise ValueError("O dicionário não possui regras válidas.")
+    armazem = motor.ARMAZEM_RESULTADOS if config.RESULTADOS_INCREMENTAIS else None
+    df_final, df_comp = motor.processar_dataframe_classificador(
+        df_sku, regras, config_industria, n_processos=n_processos, progresso=progresso,
+        instrumentacao=instrumentacao, armazem=armazem, escopo=escopo, copiar=False
+    )
+    with motor.medir_etapa(instrumentacao, "Armazenamento dos resultados"):
+        tabelas = [motor.ARMAZEM_TABELAS.guardar(df) for df in (df_final, df_comp)]
+    # Resultado degradado (regra protegida sem resposta): exibido com aviso, mas não reaproveitado por outras sessões
+    sem_resposta = df_final.attrs.get('buscas_sem_resposta', 0)
+    return {'class_df_final': tabelas[0], 'class_df_comp': tabelas[1], 'class_instrumentacao': instrumentacao,
+            'class_sem_resposta': sem_resposta, 'class_concluido': True, 'reaproveitavel': not sem_resposta}
 
-def limpar_sku_cientifico(serie):
-    serie_numerica = pd.to_numeric(serie, errors='coerce')
-    serie_valida = serie_numerica.dropna()
-    return serie_valida.astype(np.int64).astype(str)
-
-def padronizar_texto_extrator(valor):
-    """Normaliza texto: Maiúsculo, Sem Acentos, Sem Pontos."""
-    if pd.isna(valor): return valor
-    texto = str(valor).upper()
-    texto_normalizado = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8')
-    texto_final = texto_normalizado.replace('.', '')
-    return texto_final.strip()
-
-def ler_arquivo_robusto(uploaded_file):
-    filename = uploaded_file.name.lower()
-    if filename.endswith(('.xlsx', '.xls')):
-        try: return pd.read_excel(uploaded_file)
-        except Exception as e: return None
-
-    if filename.endswith('.csv'):
-        bytes_iniciais = uploaded_file.read(4)
-        uploaded_file.seek(0)
-        encoding_detectado = 'utf-8'
-        if bytes_iniciais.startswith(b'\xff\xfe'): encoding_detectado = 'utf-16'
-        elif bytes_iniciais.startswith(b'\xfe\xff'): encoding_detectado = 'utf-16-be'
-        elif bytes_iniciais.startswith(b'\xef\xbb\xbf'): encoding_detectado = 'utf-8-sig'
+def tarefa_extracao(arquivos, config_industria, n_processos=1, medir=False, progresso=None):
+    """arquivos: lista de (nome, bytes) dos uploads."""
+    instrumentacao = motor.Instrumentacao() if medir else None
+    df_final, conflitos, _ = motor.processar_arquivos_extrator(
+        [motor.arquivo_em_memoria(nome, dados) for nome, dados in arquivos], config_industria, progresso=progresso,
+        leitor=motor.ler_arquivo_cacheado, n_processos=n_processos, instrumentacao=instrumentacao
+    )
+    if df_final is None:
+        return {'ext_erros': conflitos, 'ext_instrumentacao': instrumentacao}
+    nome_mestre = f"Mestre_Completo_{motor.get_data_atual_str()}.xlsx"
+    with motor.medir_etapa(instrumentacao, "Fragmentação"):
+        fragmentos, relatorio_skip = motor.fragmentar_por_atributo(df_final, config_industria)
+    with motor.medir_etapa(instrumentacao, "Armazenamento dos resultados"):
+        arquivos = {nome: motor.ARMAZEM_TABELAS.guardar(df) for nome, df in {nome_mestre: df_final, **fragmentos}.items()}
+        id_conflitos = motor.ARMAZEM_TABELAS.guardar(conflitos)
+    return {'ext_arquivos': arquivos, 'ext_conflitos': id_conflitos,
+            'ext_ignorado': relatorio_skip, 'ext_instrumentacao': instrumentacao, 'ext_concluido': True}
 
-        try:
-            df = pd.read_csv(uploaded_file, encoding=encoding_detectado, sep='\t')
-            if df.shape[1] > 1: return df
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, encoding=encoding_detectado, sep=';')
-            if df.shape[1] > 1: return df
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, encoding=encoding_detectado, sep=',')
-            return df
-        except Exception:
-            try:
-                uploaded_file.seek(0)
-                return pd.read_csv(uploaded_file, encoding='latin1', sep=';')
-            except:
-                return None
-    return None
-
-# --- CARREGAMENTO DE DICIONÁRIOS COM CACHE ---
-@st.cache_data
-def carregar_dicionario_industria(nome_arquivo):
-    caminho_completo = os.path.join(PASTA_DICIONARIOS, nome_arquivo)
-    if not os.path.exists(caminho_completo):
-        return None, f"⚠️ Arquivo não encontrado: {caminho_completo}"
-    try:
-        df = pd.read_excel(caminho_completo)
-        df = df.dropna(subset=['Valor da Regra'])
-        df = df[df['Valor da Regra'].astype(str).str.strip() != '']
-        return df, None
-    except Exception as e:
-        return None, f"Erro ao ler o arquivo {nome_arquivo}: {e}"
-
-@st.cache_data
-def otimizar_regras(df_dict):
-    regras_otimizadas = {}
-    cols_necessarias = ['Tipo de Regra', 'Valor da Regra', 'Interpretação', 'Grau de Associação']
-    if df_dict is None or not all(col in df_dict.columns for col in cols_necessarias):
+def chave_tarefa(grupo, uploads, *opcoes):
+    """Identifica a entrada da tarefa (conteúdo e nome dos uploads + opções) para reaproveitar
+    o resultado quando outra sessão processa o mesmo arquivo."""
+    return (grupo, tuple((nome, hashlib.sha256(dados).hexdigest()) for nome, dados in uploads), repr(opcoes))
+
+def enviar_tarefa(grupo, funcao, *args, chave=None):
+    id_tarefa = fila_tarefas().enviar(grupo, funcao, *args, chave=chave)
+    # O id pode ser o de uma tarefa já concluída (reaproveitada): o resultado precisa ser carregado de novo
+    st.session_state.pop(f'{grupo}_tarefa_carregada', None)
+    st.session_state[f'{grupo}_tarefa'] = id_tarefa
+    st.query_params[f'tarefa_{grupo}'] = id_tarefa
+    return id_tarefa
+
+def esquecer_tarefa(grupo):
+    for chave in (f'{grupo}_tarefa', f'{grupo}_tarefa_carregada'): st.session_state.pop(chave, None)
+    st.query_params.pop(f'tarefa_{grupo}', None)
+
+def tarefa_em_andamento(grupo):
+    estado = fila_tarefas().estado(st.session_state.get(f'{grupo}_tarefa'))
+    return estado is not None and estado['estado'] not in motor.ESTADOS_FINAIS
+
+def acompanhar_tarefa(grupo):
+    """Mostra o andamento da tarefa do grupo e, quando ela conclui, carrega o resultado na sessão."""
+    id_tarefa = st.session_state.get(f'{grupo}_tarefa') or st.query_params.get(f'tarefa_{grupo}')
+    if not id_tarefa or st.session_state.get(f'{grupo}_tarefa_carregada') == id_tarefa: return
+    st.session_state[f'{grupo}_tarefa'] = id_tarefa
+    estado = fila_tarefas().estado(id_tarefa)
+    if estado is None:
+        esquecer_tarefa(grupo)
+        st.warning("A tarefa anterior não foi encontrada (expirou ou foi apagada).")
+    elif estado['estado'] == 'concluída':
+        resultado = fila_tarefas().resultado(id_tarefa)
+        if not all(motor.ARMAZEM_TABELAS.existe(t) for t in _tabelas(resultado)):
+            fila_tarefas().esquecer(id_tarefa)
+            esquecer_tarefa(grupo)
+            st.warning("O resultado da tarefa anterior expirou. Processe novamente.")
+            return
+        st.session_state.update(resultado)
+        st.session_state[f'{grupo}_tarefa_carregada'] = id_tarefa
+    elif estado['estado'] in motor.ESTADOS_FINAIS:
+        esquecer_tarefa(grupo)
+        if estado['estado'] == 'falhou': st.error(f"❌ {estado['erro']}")
+        elif estado['estado'] == 'cancelada': st.info("Tarefa cancelada.")
+        else: st.warning("A tarefa foi interrompida (o servidor reiniciou). Envie novamente.")
+    else:
+        _painel_tarefa(grupo, id_tarefa)
+
+def _tabelas(resultado):
+    """Ids de tabela do resultado de uma tarefa (valores str, ou dentro de dicts como ext_arquivos)."""
+    for valor in resultado.values():
+        if isinstance(valor, dict): yield from valor.values()
+        elif isinstance(valor, str): yield valor
+
+def tabela(id_tabela):
+    """DataFrame guardado (compartilhado entre sessões: não altere). Se expirou, levanta ValueError."""
+    df = motor.ARMAZEM_TABELAS.carregar(id_tabela)
+    if df is None: raise ValueError("o resultado expirou; processe novamente.")
+    return df
+
+def tabelas_da_sessao(grupo, *chaves):
+    """DataFrames referenciados em session_state[chave]; se algum expirou, descarta o resultado do grupo e devolve None."""
+    tabelas = [motor.ARMAZEM_TABELAS.carregar(st.session_state[chave]) for chave in chaves]
+    if any(df is None for df in tabelas):
+        st.session_state[f'{grupo}_concluido'] = False
+        esquecer_tarefa(grupo)
+        st.warning("O resultado expirou. Processe novamente.")
         return None
-        
-    for _, row in df_dict.iterrows():
-        tipo_regra = str(row['Tipo de Regra']).strip()
-        regex_pattern = str(row['Valor da Regra'])
-        interpretacao = row['Interpretação']
-        score = row['Grau de Associação'] if pd.notna(row['Grau de Associação']) else 0
-        
-        if tipo_regra not in regras_otimizadas: regras_otimizadas[tipo_regra] = []
-        try:
-            regras_otimizadas[tipo_regra].append({
-                'pattern': re.compile(regex_pattern, re.IGNORECASE),
-                'value': interpretacao,
-                'score': int(score)
-            })
-        except re.error: continue
-    return regras_otimizadas
-
-def classificar_item(descricao, regras_lista):
-    if pd.isna(descricao): return None
-    melhor_match = None
-    maior_score = -1
-    str_desc = str(descricao)
-    for regra in regras_lista:
-        if regra['pattern'].search(str_desc):
-            if regra['score'] > maior_score:
-                maior_score = regra['score']
-                melhor_match = regra['value']
-    return melhor_match
-
-def processar_dataframe_classificador(df_sku, regras_otimizadas, config_industria):
-    colunas_alvo = config_industria['colunas']
-    df_processado = df_sku.copy()
-    comparativo_data = []
-    barra = st.progress(0)
-    status = st.empty()
-    
-    for col in colunas_alvo:
-        if col not in df_processado.columns: df_processado[col] = None
-            
-    for i, col_alvo in enumerate(colunas_alvo):
-        status.text(f"Classificando: {col_alvo}...")
-        barra.progress((i + 1) / len(colunas_alvo))
-        
-        if col_alvo in regras_otimizadas:
-            lista_regras = regras_otimizadas[col_alvo]
-            novos_valores = df_processado['Nome SKU'].apply(lambda x: classificar_item(x, lista_regras))
-            old_values = df_processado[col_alvo]
-            df_processado[col_alvo] = novos_valores.combine_first(df_processado[col_alvo])
-            
-            for idx, (old, new) in enumerate(zip(old_values, df_processado[col_alvo])):
-                if str(old) != str(new) and pd.notna(new):
-                    sku_id = df_processado.iloc[idx].get('Código Barras SKU', idx)
-                    comparativo_data.append({
-                        'SKU ID': sku_id,
-                        'Descrição': df_processado.iloc[idx]['Nome SKU'],
-                        'Coluna': col_alvo,
-                        'Antes': old,
-                        'Depois': new
-                    })
-    barra.empty()
-    status.empty()
-    return df_processado, pd.DataFrame(comparativo_data)
-
-def processar_arquivos_extrator(files, config_industria):
-    lista_dfs = []
-    log_erros = []
-    debug_missing_cols = {} 
-    sku_input = config_industria["sku_origem"]
-    cols_atributos = config_industria["colunas_atributos"]
-    # Garante que o Nome SKU esteja no mestre
-    colunas_alvo = [SKU_PADRAO_FINAL, COL_NOME_SKU] + cols_atributos
-
-    progress_bar = st.progress(0)
-    
-    for i, file in enumerate(files):
-        try:
-            df_raw = ler_arquivo_robusto(file)
-            if df_raw is None: raise ValueError("Arquivo ilegível ou formato inválido.")
-            df_raw = clean_column_names(df_raw)
+    return tabelas
 
-            if sku_input not in df_raw.columns:
-                raise ValueError(f"Coluna chave '{sku_input}' não encontrada.")
+@st.fragment(run_every=1.0)
+def _painel_tarefa(grupo, id_tarefa):
+    """Reexecutado a cada segundo, sem bloquear o restante da página; ao fim, roda o app inteiro."""
+    estado = fila_tarefas().estado(id_tarefa)
+    if estado is None or estado['estado'] in motor.ESTADOS_FINAIS: st.rerun(scope="app")
+    if estado['estado'] == 'na fila':
+        texto = f"Na fila (posição {estado.get('posicao', 1)})..."
+    else:
+        texto = estado['mensagem'] or "Processando..."
+    st.progress(min(max(estado['progresso'], 0.0), 1.0), text=texto)
+    if st.button("⏹️ Cancelar", key=f"cancelar_{grupo}"):
+        fila_tarefas().cancelar(id_tarefa)
 
-            df_raw = df_raw.rename(columns={sku_input: SKU_PADRAO_FINAL})
-            skus_corrigidos = limpar_sku_cientifico(df_raw[SKU_PADRAO_FINAL])
-            df_raw[SKU_PADRAO_FINAL] = skus_corrigidos
-            df_raw = df_raw.dropna(subset=[SKU_PADRAO_FINAL])
+@st.cache_resource(show_spinner=False)
+def iniciar_aquecimento():
+    """Dispara (uma vez por servidor) o pré-carregamento dos dicionários em segundo plano."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aquecimento")
+    return executor.submit(motor.aquecer_dicionarios, config.CONFIG_CLASSIFICADOR)
 
-            colunas_existentes = [c for c in colunas_alvo if c in df_raw.columns]
-            colunas_faltantes = [c for c in colunas_alvo if c not in df_raw.columns]
-            
-            if colunas_faltantes:
-                debug_missing_cols[file.name] = {"Faltaram": colunas_faltantes, "Encontradas": list(df_raw.columns)}
+def exibir_validacao_dicionario(df_dict, file_sku):
+    with st.expander("🧪 Validação do Dicionário (regex lentas)"):
+        df_suspeitas = motor.diagnosticar_regras(df_dict)
+        if df_suspeitas.empty:
+            st.caption("Nenhuma regra com risco de backtracking catastrófico.")
+        else:
+            st.caption(f"{len(df_suspeitas)} regra(s) com risco de backtracking catastrófico "
+                       f"(limite por busca: {config.ORCAMENTO_REGEX_MS} ms).")
+            st.dataframe(df_suspeitas, use_container_width=True, hide_index=True)
+        if file_sku is None: return
+        if st.button("⏱️ Medir custo das regras nesta base", key="btn_custo_regras",
+                     help=f"Roda todas as regras em até {config.AMOSTRA_CUSTO_REGRAS} descrições distintas da base."):
+            df_sku = motor.ler_arquivo_cacheado(file_sku, [config.COL_NOME_SKU])
+            if df_sku is None or config.COL_NOME_SKU not in df_sku.columns:
+                st.error(f"❌ A planilha deve conter a coluna '{config.COL_NOME_SKU}'.")
+                return
+            descricoes = df_sku[config.COL_NOME_SKU].dropna().drop_duplicates()
+            amostra = descricoes.sample(min(len(descricoes), config.AMOSTRA_CUSTO_REGRAS), random_state=0)
+            df_custo = motor.custo_regras(motor.otimizar_regras(df_dict), amostra)
+            st.caption(f"Custo em {len(amostra)} descrições (regras mais caras primeiro).")
+            st.dataframe(df_custo.head(30), use_container_width=True, hide_index=True)
 
-            df_selecionado = df_raw[colunas_existentes].copy()
-            for col in colunas_faltantes: df_selecionado[col] = pd.NA
-            
-            df_selecionado = df_selecionado[colunas_alvo]
-            lista_dfs.append(df_selecionado)
-        except Exception as e:
-            log_erros.append(f"❌ ERRO no arquivo **{file.name}**: {str(e)}")
-        progress_bar.progress((i + 1) / len(files))
-
-    if log_erros: return None, log_erros, debug_missing_cols
-    if not lista_dfs: return None, ["Nenhum dado válido extraído."], debug_missing_cols
-
-    df_consolidado = pd.concat(lista_dfs, ignore_index=True)
-    df_consolidado = df_consolidado.dropna(subset=[SKU_PADRAO_FINAL])
-    df_consolidado = df_consolidado.drop_duplicates()
-    
-    # Sanitização (Maiúsculo, Sem Acentos, Sem Pontos)
-    cols_para_tratar = cols_atributos + [COL_NOME_SKU]
-    for col in cols_para_tratar:
-        if col in df_consolidado.columns:
-            df_consolidado[col] = df_consolidado[col].apply(padronizar_texto_extrator)
+def exibir_aquecimento(futuro):
+    with st.sidebar.expander("🔥 Pré-carregamento dos Dicionários"):
+        if not futuro.done():
+            st.caption("Carregando e compilando dicionários em segundo plano...")
+            return
+        if futuro.exception() is not None:
+            st.error(f"Falha no pré-carregamento: {futuro.exception()}")
+            return
+        df_relatorio = pd.DataFrame(futuro.result())
+        invalidas = int(df_relatorio['Regex Inválidas'].sum())
+        suspeitas = int(df_relatorio['Regex Suspeitas'].sum())
+        st.caption(f"{len(df_relatorio)} dicionários prontos · {invalidas} regex inválidas · {suspeitas} regex suspeitas")
+        st.dataframe(df_relatorio, use_container_width=True, hide_index=True)
+
+# --- DOWNLOADS COM EXPORTAÇÃO EM CACHE ---
+# Os bytes de cada resultado são gerados uma única vez (por formato) em uma thread de fundo e
+# guardados na sessão; os reruns do Streamlit apenas reaproveitam o Future já concluído.
+ROTULOS_FORMATO = {'xlsx': "Excel (.xlsx)", 'csv': "CSV (;)", 'parquet': "Parquet"}
+
+@st.cache_resource(show_spinner=False)
+def _executor_exportacao():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="exportacao")
+
+def _agendar(chave, funcao, *args):
+    exportacoes = st.session_state.setdefault('exportacoes', {})
+    if chave not in exportacoes:
+        exportacoes[chave] = _executor_exportacao().submit(funcao, *args)
+    return exportacoes[chave]
+
+def _exportar_medindo(instrumentacao, nome_arquivo, id_tabela, formato):
+    with motor.medir_etapa(instrumentacao, "Exportação", motor.trocar_extensao(nome_arquivo, formato)):
+        return motor.exportar_bytes(tabela(id_tabela), formato)
+
+def _gerar_zip(arquivos, formato):
+    return motor.gerar_zip({nome: tabela(id_tabela) for nome, id_tabela in arquivos.items()}, formato)
+
+def agendar_exportacao(grupo, nome_arquivo, id_tabela, formato='xlsx', instrumentacao=None):
+    return _agendar((grupo, nome_arquivo, formato), _exportar_medindo, instrumentacao, nome_arquivo, id_tabela, formato)
+
+def agendar_zip(grupo, nome_zip, arquivos, formato='xlsx'):
+    """arquivos: {nome: id da tabela}."""
+    return _agendar((grupo, nome_zip, formato), _gerar_zip, arquivos, formato)
+
+def limpar_exportacoes(grupo):
+    exportacoes = st.session_state.get('exportacoes', {})
+    for chave in [c for c in exportacoes if c[0] == grupo]: del exportacoes[chave]
+
+def seletor_formato(key):
+    return st.radio("Formato dos downloads:", list(motor.EXPORTADORES), format_func=ROTULOS_FORMATO.get,
+                    horizontal=True, key=key)
+
+def botao_download(rotulo, grupo, nome_arquivo, id_tabela, formato, container=st, instrumentacao=None, **kwargs):
+    try:
+        dados = agendar_exportacao(grupo, nome_arquivo, id_tabela, formato, instrumentacao).result()
+    except ValueError as e:
+        container.warning(f"{nome_arquivo}: {e}")
+        return
+    container.download_button(rotulo, data=dados, file_name=motor.trocar_extensao(nome_arquivo, formato),
+                              mime=motor.MIME_EXPORTACAO[formato], **kwargs)
+
+def botao_download_zip(rotulo, grupo, nome_zip, arquivos, formato, **kwargs):
+    with st.spinner(f"Gerando pacote com {len(arquivos)} arquivos..."):
+        try:
+            dados = agendar_zip(grupo, nome_zip, arquivos, formato).result()
+        except ValueError as e:
+            st.warning(f"{nome_zip}: {e}")
+            return
+    st.download_button(rotulo, data=dados, file_name=nome_zip, mime="application/zip", **kwargs)
+
+def exibir_instrumentacao(instrumentacao, chave):
+    """Tempos por etapa/coluna e estatísticas por regra da última execução, exportáveis em .xlsx."""
+    with st.expander("🩺 Diagnóstico de Desempenho"):
+        etapas = instrumentacao.tabela_etapas()
+        pico, acrescimo = etapas['Pico de Memória (MB)'].max(), etapas['Acréscimo de Memória (MB)'].max()
+        memoria = (f" · pico de memória na execução: {pico:.0f} MB (maior acréscimo em uma etapa: {acrescimo:.0f} MB)"
+                   if pd.notna(pico) else "")
+        st.caption(f"Tempo medido: {etapas['Tempo (s)'].sum():.2f}s{memoria} · exportações aparecem à medida que terminam")
+        por_etapa = etapas.groupby('Etapa', sort=False)['Tempo (s)'].sum().sort_values()
+        st.bar_chart(por_etapa, color="#004BDE", horizontal=True)
+        st.dataframe(etapas, use_container_width=True, hide_index=True)
 
-    skus_conflitantes = df_consolidado[df_consolidado.duplicated(subset=[SKU_PADRAO_FINAL], keep=False)]
-    return df_consolidado, skus_conflitantes, debug_missing_cols
+        regras = instrumentacao.tabela_regras()
+        if not regras.empty:
+            st.markdown("**Regras com maior tempo de regex** (avaliações e acertos por descrição distinta)")
+            st.dataframe(regras.head(50), use_container_width=True, hide_index=True)
+        st.download_button("📥 Baixar Diagnóstico", data=instrumentacao.para_excel(),
+                           file_name=f"Diagnostico_{chave}_{motor.get_data_atual_str()}.xlsx",
+                           mime=motor.MIME_EXPORTACAO['xlsx'], key=f"dl_diag_{chave}")
 
 def exibir_resumo_estatistico(df, colunas_alvo):
     st.markdown("### 📊 Estatísticas do Processamento")
@@ -225,7 +281,7 @@ def exibir_resumo_estatistico(df, colunas_alvo):
     st.markdown("#### Detalhamento por Atributo")
     for col in colunas_alvo:
         if col in df.columns:
-            series = df[col].fillna("NÃO CLASSIFICADO")
+            series = df[col].astype(object).fillna("NÃO CLASSIFICADO")  # atributos classificados são categóricos
             counts = series.value_counts()
             qtd_preenchidos = df[col].notna().sum()
             qtd_vazios = df[col].isna().sum()